@@ -1 +1,13 @@
- 
\ No newline at end of file
+from django.apps import AppConfig
+
+
+class OrganizationConfig(AppConfig):
+    """区域管理应用配置"""
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.organization'
+    verbose_name = '区域管理'
+
+    def ready(self):
+        # 打开上次写入的组织树磁盘快照，新进程的第一次树请求无需完整重建
+        from .warm_start import load_warm_tree
+        load_warm_tree()
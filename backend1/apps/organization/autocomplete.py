@@ -0,0 +1,106 @@
+"""区域输入联想
+
+基于进程内快照构建前缀索引：每个区域的名称、编码、全拼和拼音首字母各生成一个键，
+全部 (键, 快照下标) 按键排序后存为并行数组，查询时用二分查找定位前缀区间，
+不访问数据库。树版本号变化、快照被替换后，索引在下一次查询时重建。
+"""
+import threading
+from bisect import bisect_left
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:  # pypinyin为可选依赖，未安装时只支持名称和编码前缀
+    lazy_pinyin = None
+
+from .snapshot import get_snapshot
+
+# 前缀区间之后的哨兵字符，大于任何实际出现的字符
+_PREFIX_END = '\U0010ffff'
+
+
+def index_keys(name, code):
+    """生成区域的全部索引键：名称、编码、全拼、拼音首字母"""
+    keys = {name.lower(), code.lower()}
+    if lazy_pinyin is not None:
+        syllables = [syllable.lower() for syllable in lazy_pinyin(name)]
+        keys.add(''.join(syllables))
+        keys.add(''.join(syllable[0] for syllable in syllables if syllable))
+    keys.discard('')
+    return keys
+
+
+class PrefixIndex:
+    """不可变的前缀索引，keys 与 positions 一一对应并按键排序"""
+
+    __slots__ = ('snapshot', 'keys', 'positions')
+
+    def __init__(self, snapshot):
+        entries = sorted(
+            (key, position)
+            for position, (name, code) in enumerate(zip(snapshot.names, snapshot.codes))
+            for key in index_keys(name, code)
+        )
+        self.snapshot = snapshot
+        self.keys = [key for key, _ in entries]
+        self.positions = [position for _, position in entries]
+
+    def search(self, prefix, limit=10):
+        """按前缀查找区域
+
+        Args:
+            prefix: 前缀，不区分大小写
+            limit: 最多返回的区域数量
+
+        Returns:
+            list: 区域在快照中的下标，按匹配的键排序并去重
+        """
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + _PREFIX_END, start)
+        result, seen = [], set()
+        for i in range(start, end):
+            position = self.positions[i]
+            if position not in seen:
+                seen.add(position)
+                result.append(position)
+                if len(result) >= limit:
+                    break
+        return result
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_prefix_index():
+    """获取当前快照对应的前缀索引"""
+    global _index
+    snapshot = get_snapshot()
+    index = _index
+    if index is not None and index.snapshot is snapshot:
+        return index
+    with _index_lock:
+        index = _index
+        if index is None or index.snapshot is not snapshot:
+            index = PrefixIndex(snapshot)
+            _index = index
+    return index
+
+
+def autocomplete(prefix, limit=10):
+    """输入联想结果，每项包含区域基本信息和完整路径"""
+    index = get_prefix_index()
+    snapshot = index.snapshot
+    result = []
+    for position in index.search(prefix, limit):
+        org_id = snapshot.ids[position]
+        result.append({
+            'id': org_id,
+            'name': snapshot.names[position],
+            'code': snapshot.codes[position],
+            'level': snapshot.level_names[snapshot.levels[position]],
+            'full_path': snapshot.full_path(org_id),
+        })
+    return result
@@ -0,0 +1,313 @@
+"""区域批量创建和更新
+
+一次请求提交一组操作：
+    创建  {"temp_id": "a", "name": ..., "code": ..., "level": ..., "parent": 区域ID 或 "parent_temp_id": "x"}
+    更新  {"id": 区域ID, 以及需要修改的 name、code、level、parent/parent_temp_id、status、sort_order}
+
+新建区域可以通过 parent_temp_id 引用同一批次中其他新建区域的 temp_id。
+编码和同级名称不能占用本批次中其他区域的当前值，互换编码或名称需要分两次提交。
+校验以整批数据为单位在内存中完成，只需固定的4次查询（引用的已有区域及其父级、编码冲突、
+同级名称、已有子节点），与操作数量无关；全部通过后在一个事务中写入，
+树版本号只递增一次。
+"""
+from django.core.exceptions import ValidationError as ModelValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from rest_framework import serializers
+
+from .caching import deferred_invalidation
+from .models import Organization
+
+# 单次批量操作的最大条数
+BULK_MAX_ITEMS = 500
+
+UPDATABLE_FIELDS = ('name', 'code', 'level', 'status', 'sort_order')
+
+
+class BulkValidationError(Exception):
+    """批量操作校验失败，errors 为 {操作下标: {字段: 错误信息}}"""
+
+    def __init__(self, errors):
+        super().__init__('批量操作校验失败')
+        self.errors = errors
+
+
+class BulkItemSerializer(serializers.Serializer):
+    """单条操作的字段类型校验，只校验提交了的字段"""
+    id = serializers.IntegerField(required=False, allow_null=True)
+    temp_id = serializers.CharField(required=False, allow_null=True, max_length=64)
+    parent = serializers.IntegerField(required=False, allow_null=True)
+    parent_temp_id = serializers.CharField(required=False, allow_null=True, max_length=64)
+    name = serializers.CharField(required=False, max_length=255)
+    code = serializers.CharField(required=False, max_length=50)
+    level = serializers.ChoiceField(required=False, choices=Organization.LEVEL_CHOICES)
+    status = serializers.BooleanField(required=False)
+    sort_order = serializers.IntegerField(required=False)
+
+
+class _Node:
+    """操作完成后区域的最终状态"""
+
+    __slots__ = ('index', 'key', 'org', 'name', 'code', 'level', 'parent_key', 'status', 'sort_order')
+
+    def __init__(self, index, key, org=None):
+        self.index = index
+        self.key = key
+        self.org = org
+        self.name = org.name if org else None
+        self.code = org.code if org else None
+        self.level = org.level if org else None
+        self.parent_key = ('id', org.parent_id) if org and org.parent_id else None
+        self.status = org.status if org else True
+        self.sort_order = org.sort_order if org else 0
+
+
+class BulkOperation:
+    """校验并执行一组批量操作"""
+
+    def __init__(self, items):
+        self.items = items
+        self.errors = {}
+        self.nodes = []
+        self.created = {}
+
+    def error(self, index, field, message):
+        self.errors.setdefault(index, {}).setdefault(field, message)
+
+    def validate(self):
+        """校验整批操作，失败时抛出 BulkValidationError"""
+        if not isinstance(self.items, list) or not self.items:
+            raise BulkValidationError({'non_field_errors': '请提交非空的操作列表'})
+        if len(self.items) > BULK_MAX_ITEMS:
+            raise BulkValidationError({'non_field_errors': f'单次最多提交{BULK_MAX_ITEMS}条操作'})
+
+        items, existing_ids, update_ids, temp_ids = [], set(), set(), {}
+        for index, item in enumerate(self.items):
+            items.append({})
+            if not isinstance(item, dict):
+                self.error(index, 'non_field_errors', '操作必须是对象')
+                continue
+            serializer = BulkItemSerializer(data=item)
+            if not serializer.is_valid():
+                self.errors[index] = {field: messages[0] for field, messages in serializer.errors.items()}
+                continue
+            item = items[index] = serializer.validated_data
+            if item.get('id') is not None:
+                if item.get('temp_id') is not None:
+                    self.error(index, 'temp_id', '更新操作不能提供temp_id')
+                existing_ids.add(item['id'])
+                update_ids.add(item['id'])
+            elif item.get('temp_id') is not None:
+                if item['temp_id'] in temp_ids:
+                    self.error(index, 'temp_id', '临时ID重复')
+                temp_ids[item['temp_id']] = index
+            else:
+                self.error(index, 'non_field_errors', '更新操作需要提供id，创建操作需要提供temp_id')
+            if item.get('parent') is not None:
+                existing_ids.add(item['parent'])
+        self.items = items
+        self._raise_if_errors()
+
+        # 查询1：引用到的全部已有区域，以及被更新区域的当前父级
+        existing = Organization.objects.filter(
+            Q(id__in=existing_ids) | Q(children__id__in=update_ids)
+        ).distinct().in_bulk()
+        self.existing = existing
+
+        self._build_nodes(existing, temp_ids)
+        self._raise_if_errors()
+        self._check_parents()
+        self._check_codes()
+        self._check_sibling_names()
+        self._check_level_changes()
+        self._raise_if_errors()
+
+    def _raise_if_errors(self):
+        if self.errors:
+            raise BulkValidationError(self.errors)
+
+    def _build_nodes(self, existing, temp_ids):
+        """根据操作计算每个区域的最终状态"""
+        self.by_key = {}
+        for index, item in enumerate(self.items):
+            if item.get('id') is not None:
+                org = existing.get(item['id'])
+                if org is None:
+                    self.error(index, 'id', '区域不存在')
+                    continue
+                node = _Node(index, ('id', org.id), org)
+                if node.key in self.by_key:
+                    self.error(index, 'id', '同一区域只能出现一次')
+                    continue
+            else:
+                node = _Node(index, ('temp', item['temp_id']))
+                for field in ('name', 'level'):
+                    if not item.get(field):
+                        self.error(index, field, '该字段不能为空')
+
+            for field in UPDATABLE_FIELDS:
+                if field in item:
+                    setattr(node, field, item[field])
+            if 'parent_temp_id' in item and item['parent_temp_id'] is not None:
+                if item['parent_temp_id'] not in temp_ids:
+                    self.error(index, 'parent_temp_id', '引用的临时ID不存在')
+                node.parent_key = ('temp', item['parent_temp_id'])
+            elif 'parent' in item:
+                if item['parent'] is not None and item['parent'] not in existing:
+                    self.error(index, 'parent', '父级区域不存在')
+                node.parent_key = ('id', item['parent']) if item['parent'] is not None else None
+            self.by_key[node.key] = node
+            self.nodes.append(node)
+
+    def _final(self, key):
+        """区域的最终状态，未参与本次操作的已有区域返回其当前状态"""
+        node = self.by_key.get(key)
+        if node is None and key[0] == 'id':
+            node = _Node(None, key, self.existing[key[1]])
+        return node
+
+    def _check_parents(self):
+        """校验父级层级规则（Organization.ALLOWED_CHILD_LEVELS）和循环引用"""
+        for node in self.nodes:
+            if node.level not in Organization.ALLOWED_CHILD_LEVELS:
+                self.error(node.index, 'level', '无效的层级')
+                continue
+            if node.parent_key is None:
+                continue
+            parent = self._final(node.parent_key)
+            error = Organization.child_level_error(parent.level, node.level)
+            if error:
+                self.error(node.index, 'level', error)
+
+            # 沿最终状态的父级链向上，回到自身即构成循环；链上未参与操作的已有区域由物化路径判断
+            seen, current = {node.key}, parent
+            while current is not None:
+                if current.key in seen:
+                    self.error(node.index, 'parent', '不能选择自己或其子区域作为父级')
+                    break
+                seen.add(current.key)
+                if current.key not in self.by_key:
+                    if node.org is not None and current.org.path.startswith(node.org.path):
+                        self.error(node.index, 'parent', '不能选择自己或其子区域作为父级')
+                    break
+                current = self._final(current.parent_key) if current.parent_key else None
+
+    def _check_codes(self):
+        """校验编码格式和唯一性"""
+        codes = {}
+        for node in self.nodes:
+            if not node.code:
+                self.error(node.index, 'code', '编码不能为空')
+                continue
+            code_changed = node.org is None or node.code != node.org.code
+            if code_changed and node.parent_key is None and (not str(node.code).isdigit() or len(str(node.code)) != 6):
+                self.error(node.index, 'code', '编码必须是6位纯数字')
+            if node.code in codes:
+                self.error(node.index, 'code', '批次中编码重复')
+            codes[node.code] = node
+
+        # 查询2：编码当前属于其他区域。即使该区域在本批次中改用其他编码也不允许，
+        # 否则写入顺序不同会违反唯一约束，互换编码需要分两次提交
+        for code, org_id in Organization.objects.filter(code__in=codes).values_list('code', 'id'):
+            node = codes[code]
+            if node.key == ('id', org_id):
+                continue
+            if ('id', org_id) in self.by_key:
+                self.error(node.index, 'code', '该编码当前属于本批次中的另一区域，不能在同一批次中互换')
+            else:
+                self.error(node.index, 'code', '该编码已存在')
+
+    def _check_sibling_names(self):
+        """校验最终状态下同一父级内名称唯一"""
+        siblings = {}
+        for node in self.nodes:
+            key = (node.parent_key, node.name)
+            if key in siblings:
+                self.error(node.index, 'name', '同一父级下区域名称不能重复')
+            siblings[key] = node
+
+        # 查询3：已有父级下同名的其他区域
+        parent_ids = {node.parent_key[1] for node in self.nodes if node.parent_key and node.parent_key[0] == 'id'}
+        condition = Q(parent_id__in=parent_ids)
+        if any(node.parent_key is None for node in self.nodes):
+            condition |= Q(parent__isnull=True)
+        names = {node.name for node in self.nodes}
+        for org_id, parent_id, name in Organization.objects.filter(condition, name__in=names).values_list(
+            'id', 'parent_id', 'name'
+        ):
+            node = siblings.get((('id', parent_id) if parent_id else None, name))
+            if node is None or node.key == ('id', org_id):
+                continue
+            # 与编码相同，名称当前属于本批次中的其他区域时也不允许，避免写入顺序导致唯一约束冲突
+            if ('id', org_id) in self.by_key:
+                self.error(node.index, 'name', '该名称当前属于本批次中的另一同级区域，不能在同一批次中互换')
+            else:
+                self.error(node.index, 'name', '同一父级下区域名称不能重复')
+
+    def _check_level_changes(self):
+        """存在子节点的区域不能修改层级"""
+        changed = {node.org.id: node for node in self.nodes if node.org and node.level != node.org.level}
+        if not changed:
+            return
+        # 查询4：层级变化的区域中存在子节点的
+        for parent_id in Organization.objects.filter(parent_id__in=changed).values_list('parent_id', flat=True).distinct():
+            self.error(changed[parent_id].index, 'level', '该区域存在子节点，不能修改层级')
+
+    def apply(self):
+        """在一个事务中执行全部操作，树缓存只失效一次
+
+        先执行不依赖新建区域的更新，再按父子顺序创建，最后执行移动到新建区域下的更新。
+        后写入的区域会改变先写入的同级区域的层级索引，提交后统一重新读取一次。
+
+        Returns:
+            list: 与提交顺序一致的区域实例
+        """
+        updates = [node for node in self.nodes if node.org is not None]
+        creates = [node for node in self.nodes if node.org is None]
+        first = [node for node in updates if not node.parent_key or node.parent_key[0] == 'id']
+        last = [node for node in updates if node.parent_key and node.parent_key[0] == 'temp']
+
+        instances = {}
+        with transaction.atomic(), deferred_invalidation():
+            for node in first:
+                instances[node.index] = self._save(node)
+            pending = creates
+            while pending:
+                ready = [
+                    node for node in pending
+                    if not node.parent_key or node.parent_key[0] == 'id' or node.parent_key in self.created
+                ]
+                if not ready:
+                    raise BulkValidationError({pending[0].index: {'parent_temp_id': '临时ID之间存在循环引用'}})
+                for node in ready:
+                    instances[node.index] = self._save(node)
+                pending = [node for node in pending if node.index not in instances]
+            for node in last:
+                instances[node.index] = self._save(node)
+
+        indexes = dict(Organization.objects.filter(
+            pk__in=[org.pk for org in instances.values()]
+        ).values_list('id', 'hierarchical_index'))
+        for org in instances.values():
+            org.hierarchical_index = indexes[org.pk]
+        return [instances[index] for index in range(len(self.items))]
+
+    def _save(self, node):
+        org = node.org or Organization()
+        org.name, org.code, org.level = node.name, node.code, node.level
+        org.status, org.sort_order = node.status, node.sort_order
+        if node.parent_key is None:
+            org.parent = None
+        elif node.parent_key[0] == 'temp':
+            org.parent = self.created[node.parent_key]
+        else:
+            org.parent_id = node.parent_key[1]
+        try:
+            org.save()
+        except ModelValidationError as e:
+            raise BulkValidationError({node.index: e.message_dict})
+        except IntegrityError:
+            raise BulkValidationError({node.index: {'non_field_errors': '编码或同级名称与已有区域重复'}})
+        if node.org is None:
+            self.created[node.key] = org
+        return org
@@ -0,0 +1,284 @@
+"""区域缓存工具
+
+所有区域相关的缓存键（树、搜索树、org_children_*、org_index_*）都带有树版本号，
+任何写操作只需在事务提交后递增一次版本号，旧版本的缓存键即全部失效，
+不再需要逐个删除，失效操作的代价与缓存键数量无关。
+
+重建代价较高的缓存通过 get_or_build 做单飞控制：同一版本只有一个进程重建，
+其他进程在重建期间继续返回上一个成功构建的版本。
+
+带版本号的缓存值在该版本内不会变化，因此通过 tiered_cache 在共享缓存（生产环境为Redis）
+前增加一层进程内LRU缓存，版本号本身、重建锁等可变的键仍直接读写共享缓存。
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+TREE_VERSION_KEY = 'organization_tree_version'
+
+# 带版本号的缓存由版本号保证一致性，可以长时间保留
+TREE_CACHE_TIMEOUT = getattr(settings, 'ORGANIZATION_TREE_CACHE_TIMEOUT', 6 * 60 * 60)
+
+# 重建锁的超时时间，防止重建进程异常退出后锁无法释放
+REBUILD_LOCK_TIMEOUT = getattr(settings, 'ORGANIZATION_TREE_REBUILD_LOCK_TIMEOUT', 30)
+
+# 没有旧版本可用时等待其他进程重建完成的最长时间（秒）
+REBUILD_WAIT_TIMEOUT = getattr(settings, 'ORGANIZATION_TREE_REBUILD_WAIT_TIMEOUT', 5)
+REBUILD_POLL_INTERVAL = 0.05
+
+# 进程内LRU缓存的最大条目数，为0时不启用
+LOCAL_CACHE_MAX_ENTRIES = getattr(settings, 'ORGANIZATION_LOCAL_CACHE_MAX_ENTRIES', 256)
+
+# 进程内LRU缓存的最大字节数。整棵树的各编码变体单个就有数MB，只限制条目数时
+# 每次写操作留下的旧版本变体会在进程内累积
+LOCAL_CACHE_MAX_BYTES = getattr(settings, 'ORGANIZATION_LOCAL_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+
+# 非 bytes/str 的值（如子节点列表）按固定大小计入，主要由条目数上限约束
+LOCAL_CACHE_OBJECT_SIZE = 1024
+
+
+class TieredCache:
+    """两级缓存：进程内LRU缓存 + 共享缓存
+
+    只用于带树版本号的键。这类键的值在写入后不会再改变，新版本使用新的键，
+    因此进程内缓存无需主动失效，旧版本的条目会被LRU自然淘汰。
+    进程内缓存同时受条目数和字节数限制，超过字节上限的单个值只写入共享缓存。
+    从进程内缓存返回的是同一个对象，调用方不应修改返回值。
+    """
+
+    _missing = object()
+
+    def __init__(self, max_entries, max_bytes=LOCAL_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.local_misses = 0
+        self.shared_hits = 0
+        self.shared_misses = 0
+
+    def _get_local(self, key):
+        with self._lock:
+            value = self._entries.get(key, self._missing)
+            if value is self._missing:
+                self.local_misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.local_hits += 1
+            return value
+
+    @staticmethod
+    def _size(value):
+        if isinstance(value, (bytes, bytearray, str)):
+            return len(value)
+        return LOCAL_CACHE_OBJECT_SIZE
+
+    def _set_local(self, entries):
+        if not self.max_entries:
+            return
+        with self._lock:
+            for key, value in entries.items():
+                size = self._size(value)
+                if size > self.max_bytes:
+                    continue
+                self._bytes += size - self._sizes.get(key, 0)
+                self._sizes[key] = size
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                key, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(key)
+
+    def get(self, key):
+        value = self._get_local(key)
+        if value is not self._missing:
+            return value
+        value = cache.get(key)
+        if value is None:
+            self.shared_misses += 1
+            return None
+        self.shared_hits += 1
+        self._set_local({key: value})
+        return value
+
+    def get_many(self, keys):
+        result = {}
+        remote_keys = []
+        for key in keys:
+            value = self._get_local(key)
+            if value is self._missing:
+                remote_keys.append(key)
+            else:
+                result[key] = value
+        if remote_keys:
+            fetched = cache.get_many(remote_keys)
+            self.shared_hits += len(fetched)
+            self.shared_misses += len(remote_keys) - len(fetched)
+            self._set_local(fetched)
+            result.update(fetched)
+        return result
+
+    def set(self, key, value, timeout=None):
+        self.set_many({key: value}, timeout)
+
+    def set_many(self, entries, timeout=None):
+        cache.set_many(entries, TREE_CACHE_TIMEOUT if timeout is None else timeout)
+        self._set_local(entries)
+
+    def clear_local(self):
+        """清空进程内缓存和计数器"""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+            self.local_hits = self.local_misses = 0
+            self.shared_hits = self.shared_misses = 0
+
+    def stats(self):
+        """命中统计，用于调整缓存容量"""
+        return {
+            'local_entries': len(self._entries),
+            'local_max_entries': self.max_entries,
+            'local_bytes': self._bytes,
+            'local_max_bytes': self.max_bytes,
+            'local_hits': self.local_hits,
+            'local_misses': self.local_misses,
+            'shared_hits': self.shared_hits,
+            'shared_misses': self.shared_misses,
+        }
+
+
+tiered_cache = TieredCache(LOCAL_CACHE_MAX_ENTRIES)
+
+
+def get_tree_version():
+    """获取当前树版本号
+
+    版本号不存在时（首次使用或被缓存淘汰）以当前毫秒时间戳初始化，
+    保证重新初始化后的版本号大于之前用过的任何版本号，不会命中旧缓存。
+    """
+    version = cache.get(TREE_VERSION_KEY)
+    if version is None:
+        cache.add(TREE_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(TREE_VERSION_KEY)
+    return version
+
+
+def bump_tree_version():
+    """原子地递增树版本号，使所有带版本号的缓存键失效"""
+    try:
+        return cache.incr(TREE_VERSION_KEY)
+    except ValueError:
+        get_tree_version()
+        return cache.incr(TREE_VERSION_KEY)
+
+
+def versioned_key(name, version=None):
+    """生成带树版本号的缓存键"""
+    if version is None:
+        version = get_tree_version()
+    return f'{name}:v{version}'
+
+
+_deferred = threading.local()
+
+
+def invalidate_tree_cache():
+    """在当前事务提交后递增树版本号，事务回滚时不失效缓存
+
+    在 deferred_invalidation 代码块内只做记录，退出代码块时统一注册一次。
+    """
+    if getattr(_deferred, 'depth', 0):
+        _deferred.pending = True
+        return
+    transaction.on_commit(bump_tree_version)
+
+
+@contextmanager
+def deferred_invalidation():
+    """合并代码块内的全部缓存失效，批量写入时树版本号只递增一次
+
+    应在事务内使用，代码块可以嵌套，最外层退出时才注册失效。
+    """
+    depth = getattr(_deferred, 'depth', 0)
+    if not depth:
+        _deferred.pending = False
+    _deferred.depth = depth + 1
+    try:
+        yield
+    finally:
+        _deferred.depth = depth
+        if not depth and _deferred.pending:
+            _deferred.pending = False
+            transaction.on_commit(bump_tree_version)
+
+
+def publish(name, version, variants):
+    """写入某个版本的全部变体，并记录最近一次成功构建的版本"""
+    tiered_cache.set_many({
+        versioned_key(f'{name}:{variant}', version): value
+        for variant, value in variants.items()
+    })
+    cache.set(f'{name}:latest', version, TREE_CACHE_TIMEOUT)
+
+
+def get_or_build(name, variant, build, version=None, allow_stale=True):
+    """带单飞控制的缓存读取
+
+    缓存未命中时通过 cache.add 抢占重建锁（Redis 和本地内存缓存中均为原子操作），
+    只有抢到锁的进程执行重建；其他进程优先返回最近一次成功构建的旧版本
+    （stale-while-revalidate），没有旧版本时短暂等待重建结果，超时后自行重建。
+
+    Args:
+        name: 缓存名称
+        variant: 需要返回的变体名称，如响应编码
+        build: 无参构建函数，返回 {变体名称: 值}
+        version: 树版本号，默认为当前版本
+        allow_stale: 是否允许返回旧版本
+
+    Returns:
+        tuple: (返回值所属的树版本号, 值)
+    """
+    if version is None:
+        version = get_tree_version()
+    key = versioned_key(f'{name}:{variant}', version)
+    value = tiered_cache.get(key)
+    if value is not None:
+        return version, value
+
+    lock_key = versioned_key(f'{name}:lock', version)
+    if cache.add(lock_key, 1, REBUILD_LOCK_TIMEOUT):
+        try:
+            variants = build()
+            publish(name, version, variants)
+            return version, variants[variant]
+        finally:
+            cache.delete(lock_key)
+
+    if allow_stale:
+        stale_version = cache.get(f'{name}:latest')
+        if stale_version is not None:
+            value = tiered_cache.get(versioned_key(f'{name}:{variant}', stale_version))
+            if value is not None:
+                return stale_version, value
+
+    deadline = time.monotonic() + REBUILD_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(REBUILD_POLL_INTERVAL)
+        value = tiered_cache.get(key)
+        if value is not None:
+            return version, value
+        if cache.get(lock_key) is None:
+            break
+
+    variants = build()
+    publish(name, version, variants)
+    return version, variants[variant]
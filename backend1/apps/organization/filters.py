@@ -1,14 +1,24 @@
 from django_filters import rest_framework as filters
 from .models import Organization
+from .search import search
 
 class OrganizationFilter(filters.FilterSet):
-    """组织架构过滤器"""
-    name = filters.CharFilter(lookup_expr='icontains')
-    code = filters.CharFilter(lookup_expr='icontains')
+    """组织架构过滤器
+
+    名称和编码的模糊匹配通过 n-gram 索引完成，语义与 icontains 相同。
+    """
+    search = filters.CharFilter(method='filter_search')
+    name = filters.CharFilter(method='filter_search')
+    code = filters.CharFilter(method='filter_search')
     level = filters.ChoiceFilter(choices=Organization.LEVEL_CHOICES)
     status = filters.BooleanFilter()
     parent = filters.NumberFilter()
     
     class Meta:
         model = Organization
-        fields = ['name', 'code', 'level', 'status', 'parent'] 
\ No newline at end of file
+        fields = ['search', 'name', 'code', 'level', 'status', 'parent']
+
+    def filter_search(self, queryset, name, value):
+        """search 同时匹配名称和编码，name、code 只匹配对应字段"""
+        fields = ('name', 'code') if name == 'search' else (name,)
+        return search(queryset, value, fields)
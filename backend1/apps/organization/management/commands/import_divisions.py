@@ -0,0 +1,252 @@
+"""批量导入 GB/T 2260 行政区划代码
+
+用法：
+    python manage.py import_divisions divisions.csv
+    python manage.py import_divisions divisions.jsonl --upsert
+
+文件中每条记录包含6位区划代码和名称：
+    CSV    每行 "代码,名称"，可以有表头
+    JSON   [{"code": "110000", "name": "北京市"}, ...] 或 {"110000": "北京市", ...}
+    JSONL  每行一个 {"code": ..., "name": ...}
+
+层级和父级由代码结构推断：AA0000 为省级；AABB00 为市级，父级为 AA0000；
+其余为县级行政区（名称以“区”结尾为区级，否则为县级），父级为 AABB00，
+不存在时为 AA0000（如直辖市下直接列出的区县）。
+
+全部记录先在内存中校验，再在一个事务内按层级批量写入，并一次性计算物化路径、
+闭包表、层级索引和搜索词元，最后只使树缓存失效一次。
+"""
+import csv
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from apps.organization.caching import invalidate_tree_cache
+from apps.organization.models import Organization, OrganizationClosure, OrganizationSearchToken
+
+
+@dataclass
+class Division:
+    """待导入的行政区划"""
+    code: str
+    name: str
+    level: str
+    tier: int
+    parent_code: str | None = None
+
+
+def parse_division(code, name):
+    """根据代码结构推断层级和父级代码"""
+    if code[2:] == '0000':
+        return Division(code, name, '省级', 0)
+    if code[4:] == '00':
+        return Division(code, name, '市级', 1, f'{code[:2]}0000')
+    level = '区级' if name.endswith('区') else '县级'
+    return Division(code, name, level, 2, f'{code[:4]}00')
+
+
+class Command(BaseCommand):
+    help = '从 GB/T 2260 行政区划代码文件（CSV、JSON 或 JSON Lines）批量导入区域'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='区划代码文件路径')
+        parser.add_argument(
+            '--format', choices=['csv', 'json', 'jsonl'],
+            help='文件格式，默认按扩展名判断'
+        )
+        parser.add_argument('--encoding', default='utf-8-sig', help='文件编码')
+        parser.add_argument('--batch-size', type=int, default=500, help='每批写入的行数')
+        parser.add_argument(
+            '--upsert', action='store_true',
+            help='已存在的代码更新名称、层级和父级，而不是报错'
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'文件不存在: {path}')
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in ('csv', 'json', 'jsonl'):
+            raise CommandError(f'无法识别的文件格式: {path.suffix}，请通过 --format 指定')
+        self.batch_size = options['batch_size']
+
+        divisions = {}
+        for code, name in self.read_records(path, file_format, options['encoding']):
+            if not code.isdigit() or len(code) != 6:
+                raise CommandError(f'编码必须是6位纯数字: {code}')
+            if code in divisions:
+                raise CommandError(f'文件中存在重复的编码: {code}')
+            divisions[code] = parse_division(code, name)
+
+        existing = self.load_existing(divisions)
+        self.resolve_parents(divisions, existing)
+        self.validate(divisions, existing, options['upsert'])
+
+        try:
+            with transaction.atomic():
+                created, updated = self.apply(divisions, existing)
+                invalidate_tree_cache()
+        except IntegrityError as e:
+            raise CommandError(f'写入失败，可能与已有的同级区域名称重复: {e}')
+        self.stdout.write(self.style.SUCCESS(f'导入完成：新建 {created} 个区域，更新 {updated} 个区域'))
+
+    def read_records(self, path, file_format, encoding):
+        """逐条读取 (代码, 名称)"""
+        with path.open(encoding=encoding, newline='') as f:
+            if file_format == 'csv':
+                for row in csv.reader(f):
+                    if len(row) < 2 or not row[0].strip().isdigit():
+                        continue  # 表头或空行
+                    yield row[0].strip(), row[1].strip()
+            elif file_format == 'jsonl':
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        yield str(record['code']).strip(), record['name'].strip()
+            else:
+                data = json.load(f)
+                items = data.items() if isinstance(data, dict) else (
+                    (record['code'], record['name']) for record in data
+                )
+                for code, name in items:
+                    yield str(code).strip(), name.strip()
+
+    def load_existing(self, divisions):
+        """读取文件中的代码及其父级代码在数据库中已存在的区域"""
+        codes = set(divisions)
+        codes.update(division.parent_code for division in divisions.values() if division.parent_code)
+        codes.update(f'{code[:2]}0000' for code in divisions)
+        existing = {}
+        codes = sorted(codes)
+        for start in range(0, len(codes), self.batch_size):
+            for org in Organization.objects.filter(code__in=codes[start:start + self.batch_size]).only(
+                'id', 'code', 'name', 'level', 'parent_id', 'path', 'depth'
+            ):
+                existing[org.code] = org
+        return existing
+
+    def resolve_parents(self, divisions, existing):
+        """县级行政区的市级代码不存在时，父级改为所属省级"""
+        for division in divisions.values():
+            if division.tier == 2 and division.parent_code not in divisions and division.parent_code not in existing:
+                division.parent_code = f'{division.code[:2]}0000'
+
+    def validate(self, divisions, existing, upsert):
+        """在内存中校验父级、层级规则和同级名称唯一性"""
+        errors = []
+        if not upsert:
+            conflicts = sorted(code for code in divisions if code in existing)
+            if conflicts:
+                errors.append(f'以下编码已存在，如需更新请使用 --upsert: {", ".join(conflicts[:20])}')
+
+        siblings = {}
+        for division in divisions.values():
+            if division.parent_code:
+                parent = divisions.get(division.parent_code) or existing.get(division.parent_code)
+                if parent is None:
+                    errors.append(f'{division.code} {division.name}: 父级 {division.parent_code} 不存在')
+                    continue
+                error = Organization.child_level_error(parent.level, division.level)
+                if error:
+                    errors.append(f'{division.code} {division.name}: {error}')
+            key = (division.parent_code, division.name)
+            if key in siblings:
+                errors.append(f'{division.code} {division.name}: 与 {siblings[key]} 同级且名称重复')
+            siblings[key] = division.code
+
+        if errors:
+            raise CommandError('\n'.join(errors))
+
+    def apply(self, divisions, existing):
+        """按层级写入区域，再统一维护物化路径、闭包表、层级索引和搜索词元
+
+        Returns:
+            tuple: (新建数量, 更新数量)
+        """
+        ids = {code: org.id for code, org in existing.items()}
+        paths = {code: org.path for code, org in existing.items()}
+        created = updated = 0
+        renamed = []
+        now = timezone.now()
+
+        for tier in range(3):
+            tier_divisions = [division for division in divisions.values() if division.tier == tier]
+            new, changed = [], []
+            for division in tier_divisions:
+                parent_id = ids.get(division.parent_code)
+                org = existing.get(division.code)
+                if org is None:
+                    new.append(Organization(
+                        name=division.name, code=division.code, level=division.level,
+                        parent_id=parent_id, status=True,
+                        sort_order=Organization.LEVEL_ORDER.get(division.level, 5),
+                    ))
+                elif (org.name, org.level, org.parent_id) != (division.name, division.level, parent_id):
+                    if org.name != division.name:
+                        renamed.append(org)
+                    org.name, org.level, org.parent_id, org.updated_at = division.name, division.level, parent_id, now
+                    changed.append(org)
+
+            Organization.objects.bulk_create(new, batch_size=self.batch_size)
+            Organization.objects.bulk_update(
+                changed, ['name', 'level', 'parent', 'updated_at'], batch_size=self.batch_size
+            )
+            created += len(new)
+            updated += len(changed)
+            # MySQL 的 bulk_create 不回填主键，按编码重新读取
+            codes = [org.code for org in new]
+            for start in range(0, len(codes), self.batch_size):
+                ids.update(Organization.objects.filter(
+                    code__in=codes[start:start + self.batch_size]
+                ).values_list('code', 'id'))
+
+            self.sync_paths(tier_divisions, ids, paths, existing, divisions)
+
+        Organization.objects.rebuild_hierarchical_indexes()
+        OrganizationSearchToken.sync([
+            Organization(pk=ids[code], name=division.name, code=code)
+            for code, division in divisions.items() if code not in existing
+        ] + renamed)
+        return created, updated
+
+    def sync_paths(self, tier_divisions, ids, paths, existing, divisions):
+        """计算一层区域的物化路径和深度，为路径变化的区域重建闭包表记录
+
+        已有区域被移动到新的父级时，其下级区域必须同在文件中，否则路径无法一并更新。
+        """
+        moved = []
+        for division in tier_divisions:
+            parent_path = paths[division.parent_code] if division.parent_code else ''
+            path = f'{parent_path}{ids[division.code]}{Organization.PATH_SEPARATOR}'
+            if paths.get(division.code) != path:
+                org = existing.get(division.code)
+                if org is not None and org.path and any(
+                    code not in divisions
+                    for code in Organization.objects.subtree(org.path).values_list('code', flat=True)
+                ):
+                    raise CommandError(f'{division.code} {division.name}: 父级发生变化且下级区域不在文件中，请通过接口移动')
+                moved.append(Organization(
+                    pk=ids[division.code], path=path, depth=path.count(Organization.PATH_SEPARATOR)
+                ))
+            paths[division.code] = path
+        if not moved:
+            return
+
+        Organization.objects.bulk_update(moved, ['path', 'depth'], batch_size=self.batch_size)
+        moved_ids = [org.pk for org in moved]
+        for start in range(0, len(moved_ids), self.batch_size):
+            OrganizationClosure.objects.filter(
+                descendant_id__in=moved_ids[start:start + self.batch_size]
+            ).delete()
+        links = []
+        for org in moved:
+            ancestor_ids = [int(org_id) for org_id in org.path.split(Organization.PATH_SEPARATOR) if org_id]
+            links.extend(
+                OrganizationClosure(ancestor_id=ancestor_id, descendant_id=org.pk, depth=depth)
+                for depth, ancestor_id in enumerate(reversed(ancestor_ids))
+            )
+        OrganizationClosure.objects.bulk_create(links, batch_size=1000)
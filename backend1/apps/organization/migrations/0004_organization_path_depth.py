@@ -0,0 +1,53 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+def backfill_paths(apps, schema_editor):
+    """根据现有的父子关系回填物化路径和深度"""
+    Organization = apps.get_model("organization", "Organization")
+    parents = dict(Organization.objects.values_list("id", "parent_id"))
+    paths = {}
+
+    def build_path(org_id):
+        if org_id not in paths:
+            parent_id = parents.get(org_id)
+            prefix = build_path(parent_id) if parent_id else ""
+            paths[org_id] = f"{prefix}{org_id}/"
+        return paths[org_id]
+
+    orgs = []
+    for org in Organization.objects.only("id", "parent_id"):
+        org.path = build_path(org.id)
+        org.depth = org.path.count("/")
+        orgs.append(org)
+    Organization.objects.bulk_update(orgs, ["path", "depth"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("organization", "0003_update_parent_on_delete"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="organization",
+            name="path",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default="",
+                editable=False,
+                max_length=255,
+                verbose_name="物化路径",
+            ),
+        ),
+        migrations.AddField(
+            model_name="organization",
+            name="depth",
+            field=models.PositiveSmallIntegerField(
+                default=0, editable=False, verbose_name="深度"
+            ),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
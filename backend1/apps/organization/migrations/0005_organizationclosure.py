@@ -0,0 +1,74 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_closure(apps, schema_editor):
+    """根据物化路径回填闭包表"""
+    Organization = apps.get_model("organization", "Organization")
+    OrganizationClosure = apps.get_model("organization", "OrganizationClosure")
+    links = []
+    for org_id, path in Organization.objects.values_list("id", "path").iterator():
+        ids = [int(i) for i in path.split("/") if i]
+        for depth, ancestor_id in enumerate(reversed(ids)):
+            links.append(
+                OrganizationClosure(
+                    ancestor_id=ancestor_id, descendant_id=org_id, depth=depth
+                )
+            )
+    OrganizationClosure.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("organization", "0004_organization_path_depth"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrganizationClosure",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("depth", models.PositiveSmallIntegerField(verbose_name="相对深度")),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="descendant_links",
+                        to="organization.organization",
+                        verbose_name="祖先区域",
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ancestor_links",
+                        to="organization.organization",
+                        verbose_name="后代区域",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "区域闭包",
+                "verbose_name_plural": "区域闭包",
+                "indexes": [
+                    models.Index(
+                        fields=["descendant", "depth"],
+                        name="organizatio_descend_93bdbf_idx",
+                    )
+                ],
+                "unique_together": {("ancestor", "descendant")},
+            },
+        ),
+        migrations.RunPython(backfill_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:40
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def backfill_hierarchical_index(apps, schema_editor):
+    """按同级排序规则回填层级索引"""
+    Organization = apps.get_model("organization", "Organization")
+    children = defaultdict(list)
+    orgs = {}
+    for org in Organization.objects.only("id", "parent_id", "sort_order", "code").order_by(
+        "sort_order", "code", "id"
+    ):
+        orgs[org.id] = org
+        children[org.parent_id].append(org)
+
+    stack = [(None, "")]
+    while stack:
+        parent_id, prefix = stack.pop()
+        for position, org in enumerate(children.get(parent_id, []), start=1):
+            org.hierarchical_index = f"{prefix}{position}"
+            stack.append((org.id, f"{org.hierarchical_index}."))
+    Organization.objects.bulk_update(orgs.values(), ["hierarchical_index"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("organization", "0005_organizationclosure"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="organization",
+            name="hierarchical_index",
+            field=models.CharField(
+                blank=True,
+                default="",
+                editable=False,
+                max_length=100,
+                verbose_name="层级索引",
+            ),
+        ),
+        migrations.RunPython(backfill_hierarchical_index, migrations.RunPython.noop),
+    ]
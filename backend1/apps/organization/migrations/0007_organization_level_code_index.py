@@ -0,0 +1,16 @@
+# Generated by Django 5.0.2 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("organization", "0006_organization_hierarchical_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="organization",
+            index=models.Index(fields=["level", "code"], name="organizatio_level_3c6a4e_idx"),
+        ),
+    ]
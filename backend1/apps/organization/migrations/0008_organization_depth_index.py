@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-18 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("organization", "0007_organization_level_code_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="organization",
+            name="depth",
+            field=models.PositiveSmallIntegerField(
+                db_index=True, default=0, editable=False, verbose_name="深度"
+            ),
+        ),
+    ]
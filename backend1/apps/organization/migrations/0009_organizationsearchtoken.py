@@ -0,0 +1,72 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+NGRAM_SIZE = 2
+
+
+def backfill_search_tokens(apps, schema_editor):
+    """为不支持 ngram 全文索引的数据库回填词元表"""
+    if schema_editor.connection.vendor == "mysql":
+        return
+    Organization = apps.get_model("organization", "Organization")
+    OrganizationSearchToken = apps.get_model("organization", "OrganizationSearchToken")
+    tokens = []
+    for org_id, name, code in Organization.objects.values_list("id", "name", "code").iterator():
+        found = set()
+        for text in (name.lower(), code.lower()):
+            for size in range(1, NGRAM_SIZE + 1):
+                found.update(text[i:i + size] for i in range(len(text) - size + 1))
+        tokens.extend(OrganizationSearchToken(organization_id=org_id, token=token) for token in found)
+    OrganizationSearchToken.objects.bulk_create(tokens, batch_size=1000)
+
+
+def create_fulltext_index(apps, schema_editor):
+    """MySQL 上为名称和编码创建 ngram 全文索引"""
+    if schema_editor.connection.vendor != "mysql":
+        return
+    schema_editor.execute(
+        "ALTER TABLE organization_organization "
+        "ADD FULLTEXT INDEX organization_name_code_ngram (name, code) WITH PARSER ngram"
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    schema_editor.execute(
+        "ALTER TABLE organization_organization DROP INDEX organization_name_code_ngram"
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("organization", "0008_organization_depth_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrganizationSearchToken",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("token", models.CharField(max_length=8, verbose_name="词元")),
+                (
+                    "organization",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_tokens",
+                        to="organization.organization",
+                        verbose_name="区域",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "区域搜索词元",
+                "verbose_name_plural": "区域搜索词元",
+                "unique_together": {("token", "organization")},
+            },
+        ),
+        migrations.RunPython(backfill_search_tokens, migrations.RunPython.noop),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
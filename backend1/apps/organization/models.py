@@ -1,5 +1,114 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Max, Q, Value, Window
+from django.db.models.functions import Concat, RowNumber, Substr
 from django.core.exceptions import ValidationError
+from .caching import invalidate_tree_cache
+
+
+class OrganizationQuerySet(models.QuerySet):
+    """区域查询集
+
+    提供基于物化路径(path)的子树查询。
+    """
+
+    def subtree(self, path):
+        """获取以指定路径为根的整棵子树（包括根节点本身）
+
+        使用区间条件 path >= '1/5/' AND path < '1/50' 代替 LIKE，
+        '/' 的下一个字符是 '0'，因此该区间恰好覆盖所有以该前缀开头的路径，
+        可以直接走 path 索引的范围扫描。
+        """
+        return self.filter(path__gte=path, path__lt=path[:-1] + '0')
+
+    def descendants_of(self, ids, max_depth=None, include_self=True):
+        """批量获取多个区域的后代
+
+        通过闭包表一次连接查询完成，不再逐层递归。
+
+        Args:
+            ids: 祖先区域ID列表
+            max_depth: 相对祖先的最大深度，None表示不限制
+            include_self: 是否包含祖先本身
+        """
+        lookups = {'ancestor_links__ancestor_id__in': ids}
+        if max_depth is not None:
+            lookups['ancestor_links__depth__lte'] = max_depth
+        if not include_self:
+            lookups['ancestor_links__depth__gte'] = 1
+        return self.filter(**lookups).distinct()
+
+    def ancestors_of(self, ids, include_self=False):
+        """批量获取多个区域的全部祖先，通过闭包表一次连接查询完成"""
+        lookups = {'descendant_links__descendant_id__in': ids}
+        if not include_self:
+            lookups['descendant_links__depth__gte'] = 1
+        return self.filter(**lookups).distinct()
+
+    def nearest_common_ancestor(self, ids):
+        """获取多个区域的最近公共祖先，不存在时返回None
+
+        公共祖先即闭包表中覆盖全部给定区域的祖先，取其中深度最大者。
+        """
+        ids = set(ids)
+        return self.filter(
+            descendant_links__descendant_id__in=ids
+        ).annotate(
+            matched=Count('descendant_links__descendant_id', distinct=True)
+        ).filter(matched=len(ids)).order_by('-depth').first()
+
+    def fingerprint(self):
+        """生成区域表的数据指纹
+
+        由行数、最大ID和最大更新时间组成：新建会改变最大ID，删除会改变行数，
+        修改和移动会改变被保存区域的更新时间。用于判断持久化的快照是否仍与数据库一致。
+        """
+        result = self.model.objects.aggregate(
+            count=Count('id'), max_id=Max('id'), max_updated_at=Max('updated_at')
+        )
+        max_updated_at = result['max_updated_at']
+        return '{}:{}:{}'.format(
+            result['count'],
+            result['max_id'] or 0,
+            max_updated_at.isoformat() if max_updated_at else '',
+        )
+
+    def hierarchical_indexes(self):
+        """批量计算全部区域的层级索引
+
+        使用一次 ROW_NUMBER() OVER (PARTITION BY parent ORDER BY sort_order, code)
+        查询得到每个节点在同级中的序号，再在内存中沿父级拼接为 "1.2.3" 形式。
+
+        Returns:
+            dict: 区域ID到层级索引的映射
+        """
+        ranks = self.model.objects.annotate(
+            sibling_rank=Window(
+                expression=RowNumber(),
+                partition_by=[F('parent_id')],
+                order_by=[F(field).asc() for field in self.model.SIBLING_ORDERING],
+            )
+        ).order_by('depth').values_list('id', 'parent_id', 'sibling_rank')
+
+        indexes = {}
+        for org_id, parent_id, rank in ranks:
+            prefix = f'{indexes[parent_id]}.' if parent_id in indexes else ''
+            indexes[org_id] = f'{prefix}{rank}'
+        return indexes
+
+    def rebuild_hierarchical_indexes(self):
+        """重新计算并写回全部层级索引，只更新发生变化的行
+
+        Returns:
+            int: 更新的行数
+        """
+        indexes = self.hierarchical_indexes()
+        stale = [
+            self.model(id=org_id, hierarchical_index=indexes[org_id])
+            for org_id, stored in self.model.objects.values_list('id', 'hierarchical_index')
+            if indexes.get(org_id, stored) != stored
+        ]
+        return self.model.objects.bulk_update(stale, ['hierarchical_index'], batch_size=500)
+
 
 class Organization(models.Model):
     """区域管理模型"""
@@ -17,6 +126,17 @@ class Organization(models.Model):
         '县级': 4
     }
 
+    # 各层级允许的下级层级，模型校验、批量接口和导入命令共用这一规则
+    ALLOWED_CHILD_LEVELS = {
+        '省级': ('市级', '区级', '县级'),
+        '市级': ('区级', '县级'),
+        '区级': (),
+        '县级': (),
+    }
+
+    # 物化路径分隔符，路径形如 "1/5/12/"
+    PATH_SEPARATOR = '/'
+
     name = models.CharField(max_length=255, verbose_name='区域名称')
     code = models.CharField(max_length=50, unique=True, verbose_name='编码')
     parent = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='children', verbose_name='父级区域')
@@ -25,16 +145,49 @@ class Organization(models.Model):
     sort_order = models.IntegerField(default=0, verbose_name='排序')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+    path = models.CharField(max_length=255, blank=True, default='', db_index=True, editable=False, verbose_name='物化路径')
+    depth = models.PositiveSmallIntegerField(default=0, db_index=True, editable=False, verbose_name='深度')
+    hierarchical_index = models.CharField(max_length=100, blank=True, default='', editable=False, verbose_name='层级索引')
+
+    objects = OrganizationQuerySet.as_manager()
 
     class Meta:
         verbose_name = '区域'
         verbose_name_plural = '区域管理'
         ordering = ['level', 'code']  # 首先按层级排序，然后按编码排序
         unique_together = [['parent', 'name']]
+        indexes = [
+            # 列表键集分页按 (level, code) 定位
+            models.Index(fields=['level', 'code'], name='organizatio_level_3c6a4e_idx'),
+        ]
+
+    # 同级排序规则，层级索引按此顺序编号
+    SIBLING_ORDERING = ('sort_order', 'code', 'id')
+
+    # 由树维护逻辑写入的字段，普通保存时不覆盖
+    TREE_FIELDS = ('path', 'depth', 'hierarchical_index')
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """记录从数据库加载时的字段值，用于保存时判断节点是否移动或重新排序"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    @classmethod
+    def child_level_error(cls, parent_level, level):
+        """父级下不能添加该层级时返回错误信息，否则返回None"""
+        allowed = cls.ALLOWED_CHILD_LEVELS.get(parent_level, ())
+        if level in allowed:
+            return None
+        if not allowed:
+            return f'{parent_level}不能添加下级区域'
+        names = allowed[0] if len(allowed) == 1 else f'{"、".join(allowed[:-1])}或{allowed[-1]}'
+        return f'{parent_level}下只能添加{names}'
+
     def clean(self):
         """数据验证"""
         if self.parent:
@@ -43,12 +196,9 @@ class Organization(models.Model):
             current_level_order = self.LEVEL_ORDER.get(self.level, 0)
             
             # 严格检查层级关系
-            if self.parent.level == '省级' and self.level not in ['市级', '区级', '县级']:
-                raise ValidationError({'level': '省级下只能添加市级、区级或县级'})
-            elif self.parent.level == '市级' and self.level not in ['区级', '县级']:
-                raise ValidationError({'level': '市级下只能添加区级或县级'})
-            elif self.parent.level in ['区级', '县级']:
-                raise ValidationError({'level': f'{self.parent.level}不能添加下级区域'})
+            error = self.child_level_error(self.parent.level, self.level)
+            if error:
+                raise ValidationError({'level': error})
             
             # 检查是否形成循环引用
             if self.would_create_cycle():
@@ -59,42 +209,206 @@ class Organization(models.Model):
         #         raise ValidationError({'level': '顶级区域必须是省级'})
 
     def save(self, *args, **kwargs):
-        """保存前进行验证和设置排序值"""
+        """保存前进行验证和设置排序值，提交后使区域缓存失效"""
         self.clean()
         if not self.sort_order:
             self.sort_order = self.LEVEL_ORDER.get(self.level, 5)
-        super().save(*args, **kwargs)
+        created = self._state.adding
+        loaded = getattr(self, '_loaded_values', {})
+        old_parent_id = loaded.get('parent_id', self.parent_id)
+        moved = not created and old_parent_id != self.parent_id
+        resorted = any(
+            loaded.get(field, getattr(self, field)) != getattr(self, field)
+            for field in ('sort_order', 'code')
+        )
+        renamed = any(
+            loaded.get(field, getattr(self, field)) != getattr(self, field)
+            for field in ('name', 'code')
+        )
+        if not created and 'update_fields' not in kwargs:
+            # 路径、深度和层级索引由下面的维护逻辑单独改写，避免用内存中的旧值覆盖
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.TREE_FIELDS
+            ]
+
+        with transaction.atomic():
+            if created or moved or resorted:
+                # 先锁定父级（移动时还有原父级和自身），同一父级下的并发新建、移动在此排队，
+                # 后续读取的父级路径和同级节点不会缺少对方刚提交的行；
+                # 在被移动子树下新建的区域锁定其父级，与子树路径的UPDATE互斥
+                Organization._lock_rows(self.parent_id, old_parent_id, self.pk if moved else None)
+            super().save(*args, **kwargs)
+            if created or moved:
+                self._sync_path(created)
+                self._sync_closure(created)
+            if created or renamed:
+                OrganizationSearchToken.sync([self])
+
+            # 仅在新建、移动或排序字段变化时重新计算受影响的同级索引
+            if moved:
+                Organization._reindex_siblings(old_parent_id)
+            if created or moved or resorted:
+                Organization._reindex_siblings(self.parent_id)
+                self.hierarchical_index = Organization.objects.filter(
+                    pk=self.pk
+                ).values_list('hierarchical_index', flat=True).get()
+            invalidate_tree_cache()
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+        }
+
+    def delete(self, *args, **kwargs):
+        """删除区域后重新计算原同级节点的层级索引，提交后使区域缓存失效"""
+        with transaction.atomic():
+            Organization._lock_rows(self.parent_id)
+            result = super().delete(*args, **kwargs)
+            Organization._reindex_siblings(self.parent_id)
+            invalidate_tree_cache()
+        return result
+
+    @classmethod
+    def _lock_rows(cls, *ids):
+        """按主键顺序对区域行加行锁直到事务结束，数据库不支持行锁时不做任何事"""
+        ids = sorted({pk for pk in ids if pk})
+        if ids:
+            list(cls.objects.select_for_update().filter(pk__in=ids).order_by('pk').values_list('pk', flat=True))
+
+    @classmethod
+    def _reindex_siblings(cls, parent_id):
+        """重新计算指定父级下同级节点的层级索引
+
+        只改写编号发生变化的节点，并用一条UPDATE替换其子树的索引前缀。
+        子树范围同时以物化路径和旧索引前缀限定，避免误改刚移入该子树的节点。
+        调用方需已锁定父级行；这里用加锁读读取最新提交的数据，不受事务快照影响。
+        """
+        if parent_id:
+            prefix = cls.objects.select_for_update().filter(
+                pk=parent_id
+            ).values_list('hierarchical_index', flat=True).first()
+            if prefix is None:
+                return
+            prefix = f'{prefix}.'
+        else:
+            prefix = ''
+
+        siblings = cls.objects.select_for_update().filter(parent_id=parent_id).order_by(
+            *cls.SIBLING_ORDERING
+        ).values_list('id', 'path', 'hierarchical_index')
+        for position, (org_id, path, old_index) in enumerate(siblings, start=1):
+            new_index = f'{prefix}{position}'
+            if new_index == old_index:
+                continue
+            if old_index:
+                cls.objects.subtree(path).filter(
+                    Q(hierarchical_index=old_index) |
+                    Q(hierarchical_index__startswith=f'{old_index}.')
+                ).update(
+                    hierarchical_index=Concat(
+                        Value(new_index), Substr('hierarchical_index', len(old_index) + 1)
+                    )
+                )
+            else:
+                cls.objects.filter(pk=org_id).update(hierarchical_index=new_index)
+
+    def _sync_path(self, created):
+        """同步物化路径和深度
+
+        新建节点时写入自身路径；节点被移动到新的父级下时，
+        用一条UPDATE改写整棵子树的路径前缀和深度。
+        父级和自身的旧路径均以加锁读从数据库读取最新提交的值，不依赖内存中
+        或事务快照中可能过期的值。
+        """
+        parent_path = Organization.objects.select_for_update().filter(
+            pk=self.parent_id
+        ).values_list('path', flat=True).get() if self.parent_id else ''
+        new_path = f'{parent_path}{self.pk}{self.PATH_SEPARATOR}'
+        new_depth = new_path.count(self.PATH_SEPARATOR)
+
+        if created:
+            Organization.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+        else:
+            old_path, old_depth = Organization.objects.select_for_update().filter(
+                pk=self.pk
+            ).values_list('path', 'depth').get()
+            Organization.objects.subtree(old_path).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (new_depth - old_depth),
+            )
+        self.path = new_path
+        self.depth = new_depth
+
+    def _sync_closure(self, created):
+        """维护闭包表
+
+        新建节点时写入自身及全部祖先的关系；移动节点时先删除子树与旧祖先的关系，
+        再批量写入子树与新祖先的关系。删除节点时闭包记录随外键级联删除。
+        """
+        # 祖先在路径中的位置即其深度（根节点深度为1）
+        ancestors = list(enumerate(self.get_ancestor_ids(), start=1))
+        if created:
+            links = [OrganizationClosure(ancestor_id=self.pk, descendant_id=self.pk, depth=0)]
+            links.extend(
+                OrganizationClosure(ancestor_id=ancestor_id, descendant_id=self.pk, depth=self.depth - depth)
+                for depth, ancestor_id in ancestors
+            )
+        else:
+            # 子树各行已被上面的路径UPDATE锁定，加锁读保证包含并发事务刚提交的子节点
+            subtree = list(Organization.objects.subtree(self.path).select_for_update().values_list('id', 'depth'))
+            subtree_ids = [org_id for org_id, _ in subtree]
+            OrganizationClosure.objects.filter(
+                descendant_id__in=subtree_ids
+            ).exclude(ancestor_id__in=subtree_ids).delete()
+            links = [
+                OrganizationClosure(ancestor_id=ancestor_id, descendant_id=org_id, depth=org_depth - depth)
+                for depth, ancestor_id in ancestors
+                for org_id, org_depth in subtree
+            ]
+        OrganizationClosure.objects.bulk_create(links, batch_size=1000)
+
+    def get_ancestor_ids(self):
+        """获取从根节点到父级的祖先ID列表，直接解析物化路径，不查询数据库"""
+        if self.path:
+            path = self.path
+        elif self.parent_id:
+            # 尚未保存的节点，祖先即父级路径上的全部节点
+            path = self.parent.path
+        else:
+            return []
+        ids = [int(i) for i in path.split(self.PATH_SEPARATOR) if i]
+        return ids[:-1] if self.path else ids
 
     def would_create_cycle(self):
-        """检查是否会形成循环引用"""
-        if not self.parent:
+        """检查是否会形成循环引用
+
+        新的父级位于自身子树内即构成循环，通过一次路径前缀查询判断。
+        """
+        if not self.parent_id or not self.pk:
             return False
-        
-        current = self.parent
-        while current is not None:
-            if current.id == self.id:
-                return True
-            current = current.parent
-        return False
+        if self.parent_id == self.pk:
+            return True
+        return Organization.objects.subtree(self.path).filter(pk=self.parent_id).exists()
 
     def get_full_path(self):
         """获取完整的区域路径"""
-        path = [self.name]
-        current = self.parent
-        while current is not None:
-            path.append(current.name)
-            current = current.parent
-        return ' / '.join(reversed(path))
+        ancestor_ids = self.get_ancestor_ids()
+        names = dict(
+            Organization.objects.filter(id__in=ancestor_ids).values_list('id', 'name')
+        ) if ancestor_ids else {}
+        path = [names[i] for i in ancestor_ids if i in names]
+        path.append(self.name)
+        return ' / '.join(path)
 
     def get_all_children(self, include_self=True):
-        """获取所有子区域（包括自己）"""
-        result = []
-        if include_self:
-            result.append(self)
-        
-        for child in self.children.all():
-            result.extend(child.get_all_children(include_self=True))
-        return result
+        """获取所有子区域（包括自己）
+
+        按物化路径排序，结果为深度优先的先序顺序。
+        """
+        queryset = Organization.objects.subtree(self.path).order_by('path')
+        if not include_self:
+            queryset = queryset.exclude(pk=self.pk)
+        return list(queryset)
 
     def get_available_levels(self):
         """获取可用的下级层级"""
@@ -105,4 +419,71 @@ class Organization(models.Model):
             if order > current_order:
                 available_levels.append(level)
         
-        return available_levels
\ No newline at end of file
+        return available_levels
+
+
+class OrganizationClosure(models.Model):
+    """区域闭包表
+
+    记录每个区域与其全部祖先（含自身，深度为0）的关系，
+    用于批量的后代、祖先和公共祖先查询。
+    """
+    ancestor = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='descendant_links', verbose_name='祖先区域')
+    descendant = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='ancestor_links', verbose_name='后代区域')
+    depth = models.PositiveSmallIntegerField(verbose_name='相对深度')
+
+    class Meta:
+        verbose_name = '区域闭包'
+        verbose_name_plural = '区域闭包'
+        unique_together = [['ancestor', 'descendant']]
+        indexes = [
+            models.Index(fields=['descendant', 'depth']),
+        ]
+
+    def __str__(self):
+        return f'{self.ancestor_id} -> {self.descendant_id} ({self.depth})'
+
+
+class OrganizationSearchToken(models.Model):
+    """区域名称和编码的 n-gram 词元表
+
+    保存名称和编码（转为小写）中长度为 1 到 NGRAM_SIZE 的全部子串，
+    用于在不支持 ngram 全文索引的数据库（如测试使用的SQLite）上做索引化的子串搜索。
+    MySQL 使用 ngram 全文索引，不写入该表，见 search.py。
+    """
+    NGRAM_SIZE = 2
+
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='search_tokens', verbose_name='区域')
+    token = models.CharField(max_length=8, verbose_name='词元')
+
+    class Meta:
+        verbose_name = '区域搜索词元'
+        verbose_name_plural = '区域搜索词元'
+        unique_together = [['token', 'organization']]
+
+    def __str__(self):
+        return f'{self.token} -> {self.organization_id}'
+
+    @classmethod
+    def tokenize(cls, *texts):
+        """生成文本中长度为 1 到 NGRAM_SIZE 的全部子串"""
+        tokens = set()
+        for text in texts:
+            text = (text or '').lower()
+            for size in range(1, cls.NGRAM_SIZE + 1):
+                tokens.update(text[i:i + size] for i in range(len(text) - size + 1))
+        return tokens
+
+    @classmethod
+    def sync(cls, organizations):
+        """重新生成指定区域的词元，数据库使用全文索引时不执行任何操作"""
+        from .search import uses_fulltext_index
+        if uses_fulltext_index():
+            return
+        organizations = list(organizations)
+        cls.objects.filter(organization__in=[org.pk for org in organizations]).delete()
+        cls.objects.bulk_create([
+            cls(organization_id=org.pk, token=token)
+            for org in organizations
+            for token in cls.tokenize(org.name, org.code)
+        ], batch_size=1000)
@@ -0,0 +1,123 @@
+"""区域列表分页
+
+按模型默认排序 (level, code) 做键集分页：游标中保存当前页边界行的排序键，
+下一页通过 WHERE (level, code) > (?, ?) 定位，配合 (level, code) 联合索引，
+任意一页的查询代价都只与页大小有关，不随偏移量增长。
+编码唯一，排序键可以唯一确定一行，游标在数据增删后依然稳定。
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class OrganizationCursorPagination(BasePagination):
+    """区域列表键集分页
+
+    游标为 base64 编码的 JSON：{"k": [level, code], "r": 是否向前翻页}。
+    返回格式与 DRF 的 CursorPagination 一致：next、previous、results。
+    """
+    cursor_query_param = 'cursor'
+    page_size = getattr(settings, 'ORGANIZATION_PAGE_SIZE', 100)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'ORGANIZATION_MAX_PAGE_SIZE', 1000)
+    ordering = ('level', 'code')
+    invalid_cursor_message = '无效的分页游标'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        size = self.get_page_size(request)
+        key, reverse = self.decode_cursor(request)
+
+        if reverse:
+            queryset = queryset.order_by(*[f'-{field}' for field in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if key is not None:
+            queryset = queryset.filter(self._after(key, reverse))
+
+        # 多取一行判断当前方向上是否还有数据
+        rows = list(queryset[:size + 1])
+        has_more = len(rows) > size
+        rows = rows[:size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = key is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, key is not None
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._key(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self._key(self.page[0]), reverse=True)
+
+    def decode_cursor(self, request):
+        """解析游标，返回 (排序键, 是否向前翻页)，没有游标时排序键为None"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            key, reverse = cursor['k'], bool(cursor.get('r'))
+            if not isinstance(key, list) or len(key) != len(self.ordering):
+                raise ValueError
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return key, reverse
+
+    def encode_cursor(self, key, reverse):
+        cursor = json.dumps({'k': key, 'r': int(reverse)}, ensure_ascii=False, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _key(self, instance):
+        return [getattr(instance, field) for field in self.ordering]
+
+    def _after(self, key, reverse):
+        """构造 (level, code) 严格位于游标之后（向前翻页时为之前）的条件"""
+        lookup = 'lt' if reverse else 'gt'
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, key):
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
@@ -0,0 +1,97 @@
+"""写操作后的缓存预热
+
+写操作提交后树版本号递增，所有带版本号的缓存键随之失效。启用预热时，
+在版本号递增之后向后台线程池提交任务，按新版本重建完整的组织树和受影响区域的
+org_children_* 缓存，读请求不会遇到冷缓存。
+
+预热任务与读请求共用 get_or_build 的单飞控制，同一版本只会构建一次；
+任务在独立线程中执行，结束后关闭本线程的数据库连接，异常只记录日志。
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from .caching import get_or_build, tiered_cache, versioned_key
+from .rendering import IDENTITY, render_variants
+from .snapshot import get_snapshot
+from .warm_start import save_warm_tree, take_warm_tree
+
+logger = logging.getLogger(__name__)
+
+TREE_CACHE_NAME = 'organization_tree_cache'
+
+# 是否在写操作提交后预热缓存，未启用时由第一个读请求重建
+PREWARM_ENABLED = getattr(settings, 'ORGANIZATION_CACHE_PREWARM', False)
+
+# 预热线程数，预热任务之间通过单飞控制去重，通常一个线程即可
+PREWARM_WORKERS = getattr(settings, 'ORGANIZATION_CACHE_PREWARM_WORKERS', 1)
+
+_executor = None
+
+
+def build_tree_variants():
+    """构建完整组织树的全部编码版本
+
+    新进程优先使用启动时加载的磁盘快照，否则由进程内快照重建并写回磁盘。
+    """
+    variants = take_warm_tree()
+    if variants is None:
+        snapshot = get_snapshot()
+        variants = render_variants(snapshot.to_tree())
+        save_warm_tree(snapshot.fingerprint, variants)
+    return variants
+
+
+def prewarm_tree_cache(parent_ids=()):
+    """按当前树版本预热完整的组织树及指定区域的子节点缓存
+
+    发布使用的版本号取自快照本身，快照数据读取于该版本号之后，
+    不会把旧数据发布到新版本下。
+
+    Args:
+        parent_ids: 子节点列表需要预热的区域ID
+    """
+    snapshot = get_snapshot()
+    get_or_build(TREE_CACHE_NAME, IDENTITY, build_tree_variants, version=snapshot.version)
+    children = {
+        versioned_key(f'org_children_{org_id}', snapshot.version): snapshot.children(org_id)
+        for org_id in parent_ids
+        if org_id in snapshot
+    }
+    if children:
+        tiered_cache.set_many(children)
+
+
+def _run_prewarm(parent_ids):
+    try:
+        prewarm_tree_cache(parent_ids)
+    except Exception:
+        logger.exception('组织树缓存预热失败')
+    finally:
+        connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=PREWARM_WORKERS, thread_name_prefix='organization-prewarm'
+        )
+    return _executor
+
+
+def schedule_prewarm(parent_ids=()):
+    """在当前事务提交后提交预热任务
+
+    必须在触发写操作的 save/delete 之后调用，保证任务排在树版本号递增之后执行；
+    事务回滚时不会预热。
+
+    Args:
+        parent_ids: 子节点发生变化的区域ID，None 会被忽略
+    """
+    if not PREWARM_ENABLED:
+        return
+    parent_ids = tuple({org_id for org_id in parent_ids if org_id is not None})
+    transaction.on_commit(lambda: _get_executor().submit(_run_prewarm, parent_ids))
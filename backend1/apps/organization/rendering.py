@@ -0,0 +1,73 @@
+"""预渲染响应工具
+
+把响应数据一次性渲染为JSON字节，并预先生成gzip和brotli压缩版本，
+缓存后按请求的 Accept-Encoding 直接返回对应字节，
+避免每次请求重复进行JSON编码和压缩。
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖，未安装时只提供gzip压缩
+    brotli = None
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+IDENTITY = 'identity'
+
+# 按优先级排列的可用压缩编码
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def render_variants(data):
+    """渲染JSON字节及其全部压缩版本
+
+    Returns:
+        dict: 编码名称到响应字节的映射
+    """
+    body = JSONRenderer().render(data)
+    variants = {
+        IDENTITY: body,
+        'gzip': gzip.compress(body, compresslevel=6),
+    }
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=5)
+    return variants
+
+
+def negotiate_encoding(request):
+    """根据请求头 Accept-Encoding 选择响应编码
+
+    按 br、gzip 的优先级选择客户端接受（q值大于0）的第一个编码，
+    都不接受时返回 identity。
+    """
+    accepted = {}
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        token, _, params = part.partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token] = quality
+
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return IDENTITY
+
+
+def encoded_response(body, encoding):
+    """用已渲染的字节构造JSON响应，并设置对应的 Content-Encoding"""
+    response = HttpResponse(body, content_type='application/json')
+    if encoding != IDENTITY:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
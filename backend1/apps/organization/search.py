@@ -0,0 +1,81 @@
+"""区域名称和编码的子串搜索
+
+icontains 在 MySQL 上生成 LIKE '%x%'，无法使用任何索引。这里先用 n-gram 索引
+找出候选区域，再只对候选区域做 icontains 校验，结果与 icontains 完全一致：
+
+- MySQL：name、code 上的 ngram 全文索引（见迁移 0009），以短语方式匹配；
+  短于 ngram_token_size 的关键字无法用全文索引匹配，直接使用 icontains。
+- 其他数据库：OrganizationSearchToken 词元表，要求区域包含关键字的全部 n-gram。
+"""
+from django.db import connection
+from django.db.models import Count, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Organization, OrganizationSearchToken
+
+# 迁移 0009 在 MySQL 上创建的全文索引，MATCH 的列必须与索引列一致
+FULLTEXT_INDEX_NAME = 'organization_name_code_ngram'
+FULLTEXT_COLUMNS = ('name', 'code')
+
+# MySQL 默认的 ngram_token_size
+MYSQL_NGRAM_TOKEN_SIZE = 2
+
+
+def uses_fulltext_index():
+    """当前数据库是否使用 ngram 全文索引"""
+    return connection.vendor == 'mysql'
+
+
+def query_tokens(term):
+    """关键字需要全部命中的词元
+
+    不超过 NGRAM_SIZE 的关键字本身就是一个词元，更长的关键字拆分为全部 NGRAM_SIZE 长度的子串。
+    """
+    size = OrganizationSearchToken.NGRAM_SIZE
+    if len(term) <= size:
+        return {term}
+    return {term[i:i + size] for i in range(len(term) - size + 1)}
+
+
+def candidate_ids(term):
+    """包含关键字全部 n-gram 的候选区域ID子查询
+
+    Returns:
+        子查询，关键字无法使用索引时返回None
+    """
+    if uses_fulltext_index():
+        if len(term) < MYSQL_NGRAM_TOKEN_SIZE:
+            return None
+        table = Organization._meta.db_table
+        phrase = '"{}"'.format(term.replace('"', ' '))
+        return RawSQL(
+            f'SELECT id FROM {table} WHERE MATCH ({", ".join(FULLTEXT_COLUMNS)}) AGAINST (%s IN BOOLEAN MODE)',
+            [phrase]
+        )
+
+    tokens = query_tokens(term)
+    return OrganizationSearchToken.objects.filter(
+        token__in=tokens
+    ).values('organization_id').annotate(
+        matched=Count('token', distinct=True)
+    ).filter(matched=len(tokens)).values('organization_id')
+
+
+def search(queryset, term, fields=FULLTEXT_COLUMNS):
+    """在查询集中搜索任一字段包含关键字（不区分大小写）的区域
+
+    Args:
+        queryset: 区域查询集
+        term: 关键字
+        fields: 需要匹配的字段，为 name、code 的子集
+    """
+    term = term.strip().lower()
+    if not term:
+        return queryset
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__icontains': term})
+    candidates = candidate_ids(term)
+    if candidates is not None:
+        queryset = queryset.filter(id__in=candidates)
+    return queryset.filter(condition)
@@ -1,74 +1,80 @@
-from rest_framework import serializers
-from django.core.cache import cache
+from django.db import models
+from rest_framework import permissions, serializers
 from .models import Organization
+from .caching import get_tree_version, tiered_cache, versioned_key
+
+
+def get_requested_fields(request):
+    """解析 fields 查询参数（逗号分隔的字段名）
+
+    只对读请求生效，写请求始终使用完整的字段进行校验。
 
-def generate_hierarchical_index(obj):
-    """生成层级索引的公共方法
-    
-    Args:
-        obj: Organization实例
-        
     Returns:
-        str: 层级索引字符串,如 "1.2.3"
-        
-    Note:
-        使用缓存优化性能,缓存key格式为 org_index_{id}
-        缓存时间设置为较短时间，防止缓存不一致问题
+        set: 请求的字段名，未指定时返回None
     """
-    cache_key = f'org_index_{obj.id}'
-    cached_index = cache.get(cache_key)
-    if cached_index:
-        return cached_index
-        
-    try:
-        indices = []
-        current = obj
-        # 预先获取所有相关的父节点,减少数据库查询
-        parent_ids = []
-        while current:
-            parent_ids.append(current.id)
-            current = current.parent
-            
-        # 批量获取所有相关节点
-        related_orgs = Organization.objects.filter(
-            id__in=parent_ids
-        ).select_related('parent')
-        org_dict = {org.id: org for org in related_orgs}
-        
-        # 重新遍历生成索引
-        current = obj
-        while current:
-            siblings = Organization.objects.filter(
-                parent=current.parent
-            ).order_by('sort_order', 'code')
-            index = list(siblings).index(current) + 1
-            indices.insert(0, str(index))
-            current = org_dict.get(current.parent.id) if current.parent else None
-            
-        result = '.'.join(indices)
-        # 缓存结果 - 修改为较短的缓存时间
-        cache.set(cache_key, result, 300)  # 缓存5分钟，而不是原来的1小时
-        return result
-    except Exception as e:
-        print(f"生成层级索引时出错: {str(e)}")
-        return ''
-
-class OrganizationListSerializer(serializers.ModelSerializer):
+    if request is None or request.method not in permissions.SAFE_METHODS:
+        return None
+    value = request.query_params.get('fields')
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """按 fields 查询参数裁剪输出字段
+
+    在 __init__ 中直接移除未请求的字段，未请求的 SerializerMethodField（如 children）
+    根本不会被调用，而不是计算后再过滤。未知的字段名会被忽略。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = get_requested_fields(self.context.get('request'))
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+
+class HierarchicalIndexListSerializer(serializers.ListSerializer):
+    """批量序列化时补全层级索引
+
+    正常情况下层级索引已存储在行上，直接读取即可。对于尚未写入索引的行
+    （例如批量导入后尚未重建索引），先用 get_many 批量读取缓存，
+    仍缺失时通过一次窗口函数查询计算全部索引，并用 set_many 回写，
+    避免逐行查询和逐行缓存读写。
+    """
+
+    def to_representation(self, data):
+        items = data.all() if isinstance(data, models.manager.BaseManager) else data
+        if 'hierarchical_index' not in self.child.fields:
+            return super().to_representation(items)
+        missing = [item for item in items if not item.hierarchical_index]
+        if missing:
+            version = get_tree_version()
+            cache_keys = {versioned_key(f'org_index_{item.id}', version): item for item in missing}
+            cached = tiered_cache.get_many(cache_keys.keys())
+            if len(cached) < len(cache_keys):
+                indexes = Organization.objects.hierarchical_indexes()
+                cached = {key: indexes.get(item.id, '') for key, item in cache_keys.items()}
+                tiered_cache.set_many(cached)
+            for key, item in cache_keys.items():
+                item.hierarchical_index = cached.get(key, '')
+        return super().to_representation(items)
+
+class OrganizationListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """用于列表展示的区域序列化器
     
     这个序列化器用于简单的列表展示，不包含children字段，
     避免递归序列化可能导致的性能问题。
+    层级索引直接读取模型中存储的 hierarchical_index 字段，不产生额外查询。
     """
-    hierarchical_index = serializers.SerializerMethodField()
     
     class Meta:
         model = Organization
         fields = ['id', 'name', 'code', 'parent', 'level', 'created_at', 'updated_at', 'status', 'sort_order', 'hierarchical_index']
-        
-    def get_hierarchical_index(self, obj):
-        return generate_hierarchical_index(obj)
+        list_serializer_class = HierarchicalIndexListSerializer
 
-class OrganizationSerializer(serializers.ModelSerializer):
+class OrganizationSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """区域序列化器
     
     这个序列化器用于完整的树形结构展示，包含children字段。
@@ -76,7 +82,6 @@ class OrganizationSerializer(serializers.ModelSerializer):
     并使用OrganizationListSerializer序列化子节点，避免无限递归。
     """
     children = serializers.SerializerMethodField()
-    hierarchical_index = serializers.SerializerMethodField()
     code = serializers.CharField(required=False)  # 设置code字段为非必填
     
     def __init__(self, *args, **kwargs):
@@ -89,6 +94,7 @@ class OrganizationSerializer(serializers.ModelSerializer):
         model = Organization
         fields = ['id', 'name', 'code', 'parent', 'level', 'created_at', 
                  'updated_at', 'children', 'status', 'sort_order', 'hierarchical_index']
+        list_serializer_class = HierarchicalIndexListSerializer
         extra_kwargs = {
             'code': {'required': True}  # 默认code是必填的
         }
@@ -174,11 +180,15 @@ class OrganizationSerializer(serializers.ModelSerializer):
         """获取子节点
         
         使用select_related优化查询
-        使用短期缓存减少重复查询
+        缓存键带有树版本号，写操作后自动失效
+        子节点已通过 prefetch_related 批量取出时直接使用，不再查询和读写缓存
         """
-        cache_key = f'org_children_{obj.id}'
-        cached_children = cache.get(cache_key)
-        if cached_children:
+        if 'children' in getattr(obj, '_prefetched_objects_cache', {}):
+            return OrganizationListSerializer(obj.children.all(), many=True).data
+
+        cache_key = versioned_key(f'org_children_{obj.id}')
+        cached_children = tiered_cache.get(cache_key)
+        if cached_children is not None:
             return cached_children
             
         children = obj.children.all().select_related(
@@ -188,9 +198,5 @@ class OrganizationSerializer(serializers.ModelSerializer):
         ).order_by('sort_order', 'code', 'created_at')
         
         result = OrganizationListSerializer(children, many=True).data
-        # 减少缓存时间，提高数据更新的及时性
-        cache.set(cache_key, result, 60)  # 缓存60秒，而不是原来的1小时
-        return result
-
-    def get_hierarchical_index(self, obj):
-        return generate_hierarchical_index(obj) 
\ No newline at end of file
+        tiered_cache.set(cache_key, result)
+        return result 
\ No newline at end of file
@@ -0,0 +1,240 @@
+"""进程内区域树快照
+
+把整棵区域树加载为按列存储的只读并行数组（ID、父节点下标、名称、编码、层级等），
+树版本号变化时重新构建并整体替换。树形结构、祖先和面包屑查询直接在内存中完成，
+不访问数据库和缓存数据。
+"""
+import threading
+from array import array
+
+from rest_framework import serializers
+
+from .caching import get_tree_version
+from .models import Organization
+from .tree import link_tree, tree_node
+from .warm_start import discard_warm_tree
+
+
+class TreeSnapshot:
+    """区域树的不可变快照
+
+    各数组按同一下标对应同一个区域，顺序与模型默认排序一致；
+    parents 中保存父节点在数组中的下标，顶级区域为 -1。
+    """
+
+    __slots__ = (
+        'version', 'fingerprint', 'ids', 'parents', 'names', 'codes', 'levels', 'level_names',
+        'sort_orders', 'statuses', 'indexes', 'created_at', 'updated_at', 'positions',
+    )
+
+    def __init__(self, version, rows, fingerprint=''):
+        datetime_field = serializers.DateTimeField()
+        level_positions = {}
+        ids, parent_ids = array('q'), []
+        names, codes, indexes, created_at, updated_at = [], [], [], [], []
+        levels, sort_orders, statuses = array('B'), array('l'), array('B')
+
+        for (org_id, parent_id, name, code, level, sort_order, status,
+             hierarchical_index, created, updated) in rows:
+            ids.append(org_id)
+            parent_ids.append(parent_id)
+            names.append(name)
+            codes.append(code)
+            levels.append(level_positions.setdefault(level, len(level_positions)))
+            sort_orders.append(sort_order)
+            statuses.append(status)
+            indexes.append(hierarchical_index)
+            created_at.append(datetime_field.to_representation(created))
+            updated_at.append(datetime_field.to_representation(updated))
+
+        self.version = version
+        self.fingerprint = fingerprint
+        self.ids = ids
+        self.positions = {org_id: position for position, org_id in enumerate(ids)}
+        self.parents = array('l', (self.positions.get(parent_id, -1) for parent_id in parent_ids))
+        self.names = tuple(names)
+        self.codes = tuple(codes)
+        self.levels = levels
+        self.level_names = tuple(level_positions)
+        self.sort_orders = sort_orders
+        self.statuses = statuses
+        self.indexes = tuple(indexes)
+        self.created_at = tuple(created_at)
+        self.updated_at = tuple(updated_at)
+
+    @classmethod
+    def build(cls, version):
+        """构建指定版本的快照
+
+        先取数据指纹再读取数据，快照内容不会早于其指纹对应的数据库状态。
+        """
+        fingerprint = Organization.objects.fingerprint()
+        rows = Organization.objects.values_list(
+            'id', 'parent_id', 'name', 'code', 'level', 'sort_order', 'status',
+            'hierarchical_index', 'created_at', 'updated_at'
+        )
+        return cls(version, rows, fingerprint)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, org_id):
+        return org_id in self.positions
+
+    def level(self, org_id):
+        """获取区域层级"""
+        return self.level_names[self.levels[self.positions[org_id]]]
+
+    def ancestor_positions(self, position):
+        """获取从根节点到父节点的祖先下标"""
+        result = []
+        parent = self.parents[position]
+        while parent != -1:
+            result.append(parent)
+            parent = self.parents[parent]
+        result.reverse()
+        return result
+
+    def ancestors(self, org_id):
+        """获取从根节点到父级的祖先ID列表"""
+        return [self.ids[i] for i in self.ancestor_positions(self.positions[org_id])]
+
+    def breadcrumb(self, org_id):
+        """获取从根节点到自身的面包屑，每项包含ID、名称和层级"""
+        position = self.positions[org_id]
+        return [
+            {'id': self.ids[i], 'name': self.names[i], 'level': self.level_names[self.levels[i]]}
+            for i in self.ancestor_positions(position) + [position]
+        ]
+
+    def full_path(self, org_id):
+        """获取完整的区域路径，与 Organization.get_full_path 的格式一致"""
+        position = self.positions[org_id]
+        return ' / '.join(self.names[i] for i in self.ancestor_positions(position) + [position])
+
+    def as_instance(self, org_id):
+        """构造未保存的模型实例，用于对象级权限检查等只读场景"""
+        i = self.positions[org_id]
+        parent = self.parents[i]
+        return Organization(
+            id=org_id,
+            name=self.names[i],
+            code=self.codes[i],
+            parent_id=self.ids[parent] if parent != -1 else None,
+            level=self.level_names[self.levels[i]],
+            status=bool(self.statuses[i]),
+            sort_order=self.sort_orders[i],
+            hierarchical_index=self.indexes[i],
+        )
+
+    def node(self, position):
+        """输出与 OrganizationListSerializer 相同字段的区域数据"""
+        parent = self.parents[position]
+        return {
+            'id': self.ids[position],
+            'name': self.names[position],
+            'code': self.codes[position],
+            'parent': self.ids[parent] if parent != -1 else None,
+            'level': self.level_names[self.levels[position]],
+            'created_at': self.created_at[position],
+            'updated_at': self.updated_at[position],
+            'status': bool(self.statuses[position]),
+            'sort_order': self.sort_orders[position],
+            'hierarchical_index': self.indexes[position],
+        }
+
+    def children(self, org_id):
+        """获取直接子区域，顺序与 OrganizationSerializer.get_children 一致"""
+        position = self.positions[org_id]
+        positions = [i for i, parent in enumerate(self.parents) if parent == position]
+        positions.sort(key=lambda i: (self.sort_orders[i], self.codes[i], self.created_at[i]))
+        return [self.node(i) for i in positions]
+
+    def to_columns(self):
+        """输出列式的紧凑树结构
+
+        各列按深度优先先序排列，同级顺序与 to_tree 一致；parents 为父节点在列中的下标，
+        总是小于自身下标（顶级为 -1），客户端按顺序遍历一次即可还原树。
+        层级以 level_names 中的下标表示，不包含创建和更新时间。
+        """
+        level_order = [Organization.LEVEL_ORDER.get(name, 999) for name in self.level_names]
+        children = [[] for _ in self.ids]
+        roots = []
+        for i, parent in enumerate(self.parents):
+            (children[parent] if parent != -1 else roots).append(i)
+
+        def sort_key(i):
+            return level_order[self.levels[i]]
+
+        order = []
+        # 逆序入栈，出栈顺序即同级排序顺序
+        stack = sorted(roots, key=sort_key)[::-1]
+        while stack:
+            i = stack.pop()
+            order.append(i)
+            stack.extend(sorted(children[i], key=sort_key)[::-1])
+
+        offsets = {position: offset for offset, position in enumerate(order)}
+        return {
+            'ids': [self.ids[i] for i in order],
+            'parents': [offsets[self.parents[i]] if self.parents[i] != -1 else -1 for i in order],
+            'names': [self.names[i] for i in order],
+            'codes': [self.codes[i] for i in order],
+            'levels': [self.levels[i] for i in order],
+            'level_names': list(self.level_names),
+            'statuses': [self.statuses[i] for i in order],
+            'sort_orders': [self.sort_orders[i] for i in order],
+            'hierarchical_indexes': [self.indexes[i] for i in order],
+        }
+
+    def to_tree(self, ids=None):
+        """输出与 build_tree 相同结构的树
+
+        Args:
+            ids: 只包含这些区域ID，默认为全部区域
+        """
+        if ids is None:
+            positions = range(len(self.ids))
+        else:
+            positions = sorted(self.positions[org_id] for org_id in ids if org_id in self.positions)
+
+        nodes = {}
+        for i in positions:
+            parent = self.parents[i]
+            nodes[self.ids[i]] = tree_node({
+                'id': self.ids[i],
+                'name': self.names[i],
+                'code': self.codes[i],
+                'parent_id': self.ids[parent] if parent != -1 else None,
+                'level': self.level_names[self.levels[i]],
+                'created_at': self.created_at[i],
+                'updated_at': self.updated_at[i],
+                'status': bool(self.statuses[i]),
+                'sort_order': self.sort_orders[i],
+                'hierarchical_index': self.indexes[i],
+            })
+        return link_tree(nodes)
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    """获取当前树版本的快照
+
+    树版本号变化时由一个线程重建快照，构建完成后整体替换全局引用，
+    读取方拿到的快照在使用期间不会被修改。
+    """
+    global _snapshot
+    version = get_tree_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _snapshot_lock:
+        snapshot = _snapshot
+        if snapshot is None or snapshot.version != version:
+            snapshot = TreeSnapshot.build(version)
+            _snapshot = snapshot
+            discard_warm_tree()
+    return snapshot
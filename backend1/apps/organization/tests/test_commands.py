@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from ..models import Organization, OrganizationClosure, OrganizationSearchToken
+
+
+class ImportDivisionsCommandTest(TestCase):
+    """行政区划批量导入命令测试"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def import_divisions(self, path, *args):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_divisions', path, *args, stdout=StringIO())
+
+    def test_import_infers_hierarchy(self):
+        """测试由代码结构推断父级和层级，并维护路径、闭包表和层级索引"""
+        path = self.write('divisions.csv', '代码,名称\n'
+                          '110000,北京市\n110101,东城区\n'
+                          '130000,河北省\n130100,石家庄市\n130102,长安区\n130121,井陉县\n')
+        self.import_divisions(path)
+
+        orgs = {org.code: org for org in Organization.objects.all()}
+        self.assertEqual(len(orgs), 6)
+        self.assertEqual(orgs['110101'].parent_id, orgs['110000'].id)
+        self.assertEqual(orgs['130121'].parent_id, orgs['130100'].id)
+        self.assertEqual(
+            [orgs[code].level for code in ('130000', '130100', '130102', '130121')],
+            ['省级', '市级', '区级', '县级']
+        )
+        county = orgs['130121']
+        self.assertEqual(county.path, f"{orgs['130000'].id}/{orgs['130100'].id}/{county.id}/")
+        self.assertEqual(county.depth, 3)
+        self.assertEqual(
+            set(OrganizationClosure.objects.filter(descendant=county).values_list('ancestor_id', 'depth')),
+            {(county.id, 0), (orgs['130100'].id, 1), (orgs['130000'].id, 2)}
+        )
+        self.assertEqual(dict(Organization.objects.hierarchical_indexes()), {
+            org.id: org.hierarchical_index for org in orgs.values()
+        })
+        self.assertTrue(OrganizationSearchToken.objects.filter(organization=county, token='井陉').exists())
+
+    def test_upsert(self):
+        """测试重复导入需要 --upsert，并更新已有区域的名称"""
+        path = self.write('divisions.jsonl', '{"code": "130000", "name": "河北省"}\n'
+                                             '{"code": "130100", "name": "石家庄市"}\n')
+        self.import_divisions(path)
+        with self.assertRaises(CommandError):
+            self.import_divisions(path)
+
+        path = self.write('renamed.json', '{"130000": "河北省", "130100": "石家庄", "130102": "长安区"}')
+        self.import_divisions(path, '--upsert')
+        self.assertEqual(Organization.objects.get(code='130100').name, '石家庄')
+        self.assertEqual(Organization.objects.get(code='130102').parent.code, '130100')
+        self.assertEqual(Organization.objects.count(), 3)
+
+    def test_invalid_rows_are_rejected(self):
+        """测试父级缺失时不写入任何数据"""
+        path = self.write('divisions.csv', '130100,石家庄市\n')
+        with self.assertRaises(CommandError):
+            self.import_divisions(path)
+        self.assertFalse(Organization.objects.exists())
@@ -1,6 +1,12 @@
-from django.test import TestCase
+import threading
+import time
+from unittest import skipUnless
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
 from django.core.exceptions import ValidationError
-from ..models import Organization
+from ..models import Organization, OrganizationClosure, OrganizationSearchToken
+from ..search import search
 
 class OrganizationModelTest(TestCase):
     """组织架构模型测试"""
@@ -74,4 +80,256 @@ class OrganizationModelTest(TestCase):
                 level='街道级',
                 parent=district,
                 status=True
-            ) 
\ No newline at end of file
+            ) 
+
+        self.assertIsNone(Organization.child_level_error('省级', '县级'))
+        self.assertEqual(Organization.child_level_error('市级', '省级'), '市级下只能添加区级或县级')
+        self.assertEqual(Organization.child_level_error('区级', '县级'), '区级不能添加下级区域')
+
+    def test_materialized_path(self):
+        """测试物化路径和深度"""
+        self.assertEqual(self.province.path, f'{self.province.id}/')
+        self.assertEqual(self.province.depth, 1)
+        self.assertEqual(self.city.path, f'{self.province.id}/{self.city.id}/')
+        self.assertEqual(self.city.depth, 2)
+
+    def test_move_updates_subtree_paths(self):
+        """测试移动节点时同步更新整棵子树的路径"""
+        district = Organization.objects.create(
+            name='测试区',
+            code='110101',
+            level='区级',
+            parent=self.city,
+            status=True
+        )
+        other_province = Organization.objects.create(
+            name='另一省份',
+            code='120000',
+            level='省级',
+            status=True
+        )
+
+        self.city.parent = other_province
+        self.city.save()
+
+        district.refresh_from_db()
+        self.assertEqual(district.path, f'{other_province.id}/{self.city.id}/{district.id}/')
+        self.assertEqual(district.depth, 3)
+        self.assertEqual(
+            [org.id for org in other_province.get_all_children()],
+            [other_province.id, self.city.id, district.id]
+        )
+        self.assertEqual(self.province.get_all_children(include_self=False), [])
+
+    def test_ancestry_lookups(self):
+        """测试基于物化路径的祖先查询和循环检测"""
+        district = Organization.objects.create(
+            name='测试区',
+            code='110101',
+            level='区级',
+            parent=self.city,
+            status=True
+        )
+        self.assertEqual(district.get_full_path(), '测试省份 / 测试城市 / 测试区')
+
+        self.province.parent = district
+        self.assertTrue(self.province.would_create_cycle())
+        self.city.parent = self.province
+        self.assertFalse(self.city.would_create_cycle())
+
+    def test_closure_table(self):
+        """测试闭包表的维护和批量子树查询"""
+        district = Organization.objects.create(
+            name='测试区',
+            code='110101',
+            level='区级',
+            parent=self.city,
+            status=True
+        )
+        self.assertEqual(
+            OrganizationClosure.objects.get(ancestor=self.province, descendant=district).depth, 2
+        )
+        self.assertEqual(
+            set(Organization.objects.descendants_of([self.province.id])),
+            {self.province, self.city, district}
+        )
+        self.assertEqual(
+            set(Organization.objects.descendants_of([self.province.id], max_depth=1, include_self=False)),
+            {self.city}
+        )
+        self.assertEqual(
+            set(Organization.objects.ancestors_of([district.id])),
+            {self.province, self.city}
+        )
+
+        other_province = Organization.objects.create(
+            name='另一省份',
+            code='120000',
+            level='省级',
+            status=True
+        )
+        self.city.parent = other_province
+        self.city.save()
+
+        self.assertEqual(
+            set(Organization.objects.ancestors_of([district.id])),
+            {other_province, self.city}
+        )
+        self.assertEqual(
+            Organization.objects.nearest_common_ancestor([self.city.id, district.id]),
+            self.city
+        )
+        self.assertIsNone(
+            Organization.objects.nearest_common_ancestor([self.province.id, district.id])
+        )
+
+    def test_hierarchical_index(self):
+        """测试层级索引在新建、排序、移动和删除时的维护"""
+        second_city = Organization.objects.create(
+            name='第二城市',
+            code='110200',
+            level='市级',
+            parent=self.province,
+            status=True,
+            sort_order=2
+        )
+        district = Organization.objects.create(
+            name='测试区',
+            code='110201',
+            level='区级',
+            parent=second_city,
+            status=True
+        )
+        self.assertEqual(self.province.hierarchical_index, '1')
+        self.assertEqual(second_city.hierarchical_index, '1.2')
+        self.assertEqual(district.hierarchical_index, '1.2.1')
+
+        # 调整排序后子树索引随之改写
+        self.city.sort_order = 3
+        self.city.save()
+        district.refresh_from_db()
+        self.assertEqual(self.city.hierarchical_index, '1.2')
+        self.assertEqual(district.hierarchical_index, '1.1.1')
+
+        # 移动节点后原同级和新同级均重新编号
+        other_province = Organization.objects.create(
+            name='另一省份',
+            code='120000',
+            level='省级',
+            status=True,
+            sort_order=2
+        )
+        second_city.parent = other_province
+        second_city.save()
+        district.refresh_from_db()
+        self.city.refresh_from_db()
+        self.assertEqual(district.hierarchical_index, '2.1.1')
+        self.assertEqual(self.city.hierarchical_index, '1.1')
+
+        # 删除节点后后续同级节点前移
+        self.province.delete()
+        other_province.refresh_from_db()
+        district.refresh_from_db()
+        self.assertEqual(other_province.hierarchical_index, '1')
+        self.assertEqual(district.hierarchical_index, '1.1.1')
+
+    def test_rebuild_hierarchical_indexes(self):
+        """测试窗口函数批量计算层级索引"""
+        self.assertEqual(
+            Organization.objects.hierarchical_indexes(),
+            {self.province.id: '1', self.city.id: '1.1'}
+        )
+
+        Organization.objects.update(hierarchical_index='')
+        self.assertEqual(Organization.objects.rebuild_hierarchical_indexes(), 2)
+        self.city.refresh_from_db()
+        self.assertEqual(self.city.hierarchical_index, '1.1')
+
+    def test_ngram_search(self):
+        """测试 n-gram 搜索与 icontains 语义一致，并随名称修改更新"""
+        self.assertTrue(OrganizationSearchToken.objects.filter(organization=self.city, token='城市').exists())
+
+        def ids(term, fields=('name', 'code')):
+            return set(search(Organization.objects.all(), term, fields).values_list('id', flat=True))
+
+        self.assertEqual(ids('测试'), {self.province.id, self.city.id})
+        self.assertEqual(ids('市'), {self.city.id})
+        self.assertEqual(ids('试城市'), {self.city.id})
+        self.assertEqual(ids('0100'), {self.city.id})
+        self.assertEqual(ids('0100', fields=('name',)), set())
+
+        self.city.name = '更名城区'
+        self.city.save()
+        self.assertEqual(ids('城市'), set())
+        self.assertEqual(ids('城区'), {self.city.id})
+
+
+@skipUnless(connection.features.has_select_for_update, '数据库不支持行锁')
+class ConcurrentWriteTest(TransactionTestCase):
+    """并发写入区域树"""
+
+    def run_interleaved(self, first, second):
+        """first 在事务中执行后暂不提交，期间在另一连接上执行 second，再让 first 提交"""
+        first_done, release_first = threading.Event(), threading.Event()
+        errors = []
+
+        def run(func, hold):
+            try:
+                with transaction.atomic():
+                    func()
+                    if hold:
+                        first_done.set()
+                        release_first.wait(5)
+            except Exception as e:
+                errors.append(e)
+                first_done.set()
+            finally:
+                connection.close()
+
+        first_thread = threading.Thread(target=run, args=(first, True))
+        second_thread = threading.Thread(target=run, args=(second, False))
+        first_thread.start()
+        first_done.wait(5)
+        # 第二个事务应在行锁上等待第一个提交
+        second_thread.start()
+        time.sleep(0.5)
+        release_first.set()
+        first_thread.join()
+        second_thread.join()
+        self.assertEqual(errors, [])
+
+    def test_interleaved_creates_lock_parent(self):
+        """测试两个事务交错在同一父级下新建区域，层级索引和物化路径不冲突"""
+        province = Organization.objects.create(name='测试省份', code='110000', level='省级')
+        self.run_interleaved(
+            lambda: Organization.objects.create(name='甲市', code='110100', level='市级', parent_id=province.id),
+            lambda: Organization.objects.create(name='乙市', code='110200', level='市级', parent_id=province.id),
+        )
+        children = Organization.objects.filter(parent_id=province.id)
+        self.assertEqual(
+            sorted(children.values_list('hierarchical_index', flat=True)),
+            ['1.1', '1.2']
+        )
+        for child in children:
+            self.assertEqual(child.path, f'{province.path}{child.pk}/')
+
+    def test_create_under_moving_subtree(self):
+        """测试父级所在子树被并发移动时，新建区域的路径和闭包关系随之更新"""
+        province = Organization.objects.create(name='测试省份', code='110000', level='省级')
+        other = Organization.objects.create(name='另一省份', code='120000', level='省级')
+        city = Organization.objects.create(name='测试城市', code='110100', level='市级', parent=province)
+
+        def move():
+            city.parent = other
+            city.save()
+
+        self.run_interleaved(
+            move,
+            lambda: Organization.objects.create(name='测试区', code='110101', level='区级', parent_id=city.id),
+        )
+        district = Organization.objects.get(code='110101')
+        self.assertEqual(district.path, f'{other.id}/{city.id}/{district.id}/')
+        self.assertEqual(
+            set(OrganizationClosure.objects.filter(descendant=district).values_list('ancestor_id', flat=True)),
+            {other.id, city.id, district.id}
+        )
@@ -1,6 +1,6 @@
 from django.test import TestCase
 from ..models import Organization
-from ..serializers import OrganizationSerializer
+from ..serializers import OrganizationListSerializer, OrganizationSerializer
 
 class OrganizationSerializerTest(TestCase):
     """组织架构序列化器测试"""
@@ -63,4 +63,14 @@ class OrganizationSerializerTest(TestCase):
         child = data['children'][0]
         self.assertEqual(child['name'], '测试城市')
         self.assertEqual(child['level'], '市级')
-        self.assertEqual(child['parent'], self.province.id) 
\ No newline at end of file
+        self.assertEqual(child['parent'], self.province.id) 
+
+    def test_list_serializer_fills_missing_indexes(self):
+        """测试批量序列化时补全缺失的层级索引"""
+        Organization.objects.update(hierarchical_index='')
+        queryset = Organization.objects.order_by('id')
+
+        with self.assertNumQueries(2):
+            data = OrganizationListSerializer(queryset, many=True).data
+
+        self.assertEqual([item['hierarchical_index'] for item in data], ['1', '1.1'])
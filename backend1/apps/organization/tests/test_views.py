@@ -1,13 +1,34 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock, skipUnless
+
+from django.db import IntegrityError, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
+from django.core.cache import cache
 from ..models import Organization
+from ..serializers import OrganizationListSerializer
+from ..caching import TieredCache, bump_tree_version, get_tree_version, tiered_cache, versioned_key
+from .. import export, prewarm, views, warm_start
+from ..autocomplete import lazy_pinyin
+from ..snapshot import get_snapshot
+from ..warm_start import load_warm_tree
+from ..tree import build_tree
 
 class OrganizationViewTest(APITestCase):
     """组织架构视图测试"""
     
     def setUp(self):
         """测试数据初始化"""
+        # 测试事务不会提交，清空缓存以重置树版本号
+        cache.clear()
+        tiered_cache.clear_local()
         self.province = Organization.objects.create(
             name='测试省份',
             code='110000',
@@ -32,8 +53,30 @@ class OrganizationViewTest(APITestCase):
         """测试获取组织列表"""
         response = self.client.get(self.list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data['results']), 2)
         
+    def test_list_keyset_pagination(self):
+        """测试列表按 (level, code) 键集分页，前后翻页结果稳定"""
+        for code in ('120000', '130000'):
+            Organization.objects.create(name=f'省份{code}', code=code, level='省级')
+        expected = list(Organization.objects.order_by('level', 'code').values_list('id', flat=True))
+
+        seen, url = [], self.list_url + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(item['id'] for item in response.data['results'])
+            last_page, url = response.data, response.data['next']
+        self.assertEqual(seen, expected)
+
+        # 从最后一页向前翻页
+        previous = self.client.get(last_page['previous']).data
+        self.assertEqual([item['id'] for item in previous['results']], expected[:2])
+        self.assertIsNone(previous['previous'])
+
+        response = self.client.get(self.list_url, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_create_organization(self):
         """测试创建组织"""
         data = {
@@ -85,4 +128,467 @@ class OrganizationViewTest(APITestCase):
             'status': True
         }
         response = self.client.post(self.list_url, data, format='json')
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST) 
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST) 
+
+    def test_tree_single_query(self):
+        """测试树形结构只需读取数据指纹和一次数据查询且结构与序列化器一致"""
+        cache.clear()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('organization-tree'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        root = json.loads(response.content)[0]
+        self.assertEqual(
+            {key: value for key, value in root.items() if key != 'children'},
+            OrganizationListSerializer(self.province).data
+        )
+        self.assertEqual(root['children'][0]['id'], self.city.id)
+        self.assertEqual(root['children'][0]['children'], [])
+
+    def test_tree_cache_invalidated_on_write(self):
+        """测试写操作提交后任意搜索条件的树缓存均失效"""
+        tree_url = reverse('organization-tree')
+        response = self.client.get(tree_url, {'search': '测试城'})
+        self.assertEqual(len(json.loads(response.content)[0]['children']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Organization.objects.create(
+                name='测试城市二',
+                code='110200',
+                level='市级',
+                parent=self.province,
+                status=True
+            )
+
+        response = self.client.get(tree_url, {'search': '测试城'})
+        self.assertEqual(len(json.loads(response.content)[0]['children']), 2)
+
+    def test_tree_compressed_variants(self):
+        """测试树形结构按 Accept-Encoding 返回预压缩的字节"""
+        tree_url = reverse('organization-tree')
+        plain = self.client.get(tree_url)
+        self.assertNotIn('Content-Encoding', plain)
+
+        with self.assertNumQueries(0):
+            compressed = self.client.get(tree_url, HTTP_ACCEPT_ENCODING='gzip;q=1.0, br;q=0')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+
+    def test_conditional_get(self):
+        """测试基于树版本号的ETag条件请求"""
+        etags = {}
+        for url in [self.list_url, self.detail_url, reverse('organization-tree')]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            etags[url] = response['ETag']
+
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # 子节点变化后父节点详情的ETag随之失效
+        with self.captureOnCommitCallbacks(execute=True):
+            self.city.name = '更新后的城市'
+            self.city.save()
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etags[self.detail_url])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['children'][0]['name'], '更新后的城市')
+
+    def test_tree_single_flight_serves_stale(self):
+        """测试其他进程重建期间返回上一个版本的树"""
+        tree_url = reverse('organization-tree')
+        old_response = self.client.get(tree_url)
+
+        # 模拟新版本正在由其他进程重建
+        bump_tree_version()
+        lock_key = versioned_key('organization_tree_cache:lock')
+        cache.add(lock_key, 1)
+        self.addCleanup(cache.delete, lock_key)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(tree_url)
+        self.assertEqual(response.content, old_response.content)
+        self.assertEqual(response['ETag'], old_response['ETag'])
+        self.assertNotIn(str(get_tree_version()), response['ETag'])
+
+    def test_force_refresh_reuses_current_build(self):
+        """测试树未变化时强制刷新直接返回已构建的版本"""
+        tree_url = reverse('organization-tree')
+        response = self.client.get(tree_url)
+
+        with self.assertNumQueries(0):
+            refreshed = self.client.get(tree_url, {'force_refresh': 'true'})
+        self.assertEqual(refreshed.content, response.content)
+
+        # 树变化后强制刷新返回新版本
+        with self.captureOnCommitCallbacks(execute=True):
+            self.city.name = '更新后的城市'
+            self.city.save()
+        refreshed = self.client.get(tree_url, {'force_refresh': 'true'})
+        self.assertIn('更新后的城市', refreshed.content.decode())
+
+    def test_tree_search_expands_ancestors(self):
+        """测试搜索结果的祖先由物化路径一次得出，查询次数与匹配数量和深度无关"""
+        for code in ('110101', '110102'):
+            Organization.objects.create(name=f'测试区{code}', code=code, level='区级', parent=self.city)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('organization-tree'), {'search': '测试区'})
+        roots = json.loads(response.content)
+        self.assertEqual([node['id'] for node in roots], [self.province.id])
+        self.assertEqual([node['id'] for node in roots[0]['children']], [self.city.id])
+        self.assertEqual(len(roots[0]['children'][0]['children']), 2)
+
+    def test_tree_slice(self):
+        """测试按根区域和层数返回树的局部切片"""
+        district = Organization.objects.create(name='测试区', code='110101', level='区级', parent=self.city)
+        tree_url = reverse('organization-tree')
+
+        # 默认只返回顶级区域
+        roots = json.loads(self.client.get(tree_url, {'max_depth': 1}).content)
+        self.assertEqual([node['id'] for node in roots], [self.province.id])
+        self.assertEqual(roots[0]['children'], [])
+        self.assertTrue(roots[0]['has_children'])
+        self.assertEqual(roots[0]['child_count'], 1)
+
+        # 展开省份两层
+        nodes = json.loads(self.client.get(tree_url, {'root': self.province.id, 'max_depth': 2}).content)
+        self.assertEqual([node['id'] for node in nodes], [self.city.id])
+        self.assertEqual([node['id'] for node in nodes[0]['children']], [district.id])
+        self.assertFalse(nodes[0]['children'][0]['has_children'])
+
+        response = self.client.get(tree_url, {'root': 0})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(tree_url, {'max_depth': 'x'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_and_update(self):
+        """测试批量操作可引用新建的父级，整批在一个事务中写入且只失效一次缓存"""
+        url = reverse('organization-bulk')
+        payload = [
+            {'temp_id': 'district', 'name': '新区', 'code': '110202', 'level': '区级', 'parent_temp_id': 'city'},
+            {'temp_id': 'city', 'name': '新城市', 'code': '110200', 'level': '市级', 'parent': self.province.id},
+            {'id': self.city.id, 'name': '更新后的城市'},
+        ]
+        # 关闭预热，提交后的回调只剩树版本号递增
+        with mock.patch.object(prewarm, 'PREWARM_ENABLED', False), \
+                self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(callbacks), 1)
+
+        results = response.data['results']
+        self.assertEqual([result.get('temp_id') for result in results], ['district', 'city', None])
+        district = Organization.objects.get(pk=results[0]['id'])
+        self.assertEqual(district.parent_id, results[1]['id'])
+        self.assertEqual(district.parent.parent_id, self.province.id)
+        self.assertEqual(district.depth, 3)
+        self.assertEqual(Organization.objects.get(pk=self.city.id).name, '更新后的城市')
+
+    def test_bulk_rename_only(self):
+        """测试只修改名称时，父级不在本批次中也能通过校验"""
+        url = reverse('organization-bulk')
+        response = self.client.post(url, [{'id': self.city.id, 'name': '改名后的城市'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['name'], '改名后的城市')
+        self.assertEqual(Organization.objects.get(pk=self.city.id).name, '改名后的城市')
+
+    def test_bulk_prewarms_old_parents(self):
+        """测试移动区域后原父级和新父级的子节点缓存都被预热"""
+        other = Organization.objects.create(name='另一省份', code='120000', level='省级')
+        url = reverse('organization-bulk')
+        with mock.patch.object(views, 'schedule_prewarm') as schedule:
+            response = self.client.post(url, [{'id': self.city.id, 'parent': other.id}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue({self.province.id, other.id} <= set(schedule.call_args.args[0]))
+
+        response = self.client.post(url, [{'id': self.city.id, 'temp_id': 'x', 'name': '新名称'}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('temp_id', response.data['errors'][0])
+
+    def test_bulk_returns_current_hierarchical_index(self):
+        """测试返回的层级索引是整批写入完成后的值"""
+        url = reverse('organization-bulk')
+        payload = [
+            {'temp_id': 'b', 'name': '乙区', 'code': '110102', 'level': '区级', 'parent': self.city.id},
+            {'temp_id': 'a', 'name': '甲区', 'code': '110101', 'level': '区级', 'parent': self.city.id},
+        ]
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for result in response.data['results']:
+            self.assertEqual(
+                result['hierarchical_index'],
+                Organization.objects.get(pk=result['id']).hierarchical_index
+            )
+
+    def test_bulk_rejects_invalid_items(self):
+        """测试字段类型校验、同批次互换名称或编码以及写入时的唯一约束冲突都返回逐条错误"""
+        url = reverse('organization-bulk')
+        district = Organization.objects.create(name='测试区', code='110101', level='区级', parent=self.city)
+        county = Organization.objects.create(name='测试县', code='110102', level='县级', parent=self.city)
+
+        response = self.client.post(url, [
+            {'temp_id': ['x'], 'name': '新区', 'code': '110103', 'level': '区级', 'parent': self.city.id},
+            {'temp_id': 'y', 'name': '新区', 'code': '110104', 'level': '街道', 'parent': self.city.id},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('temp_id', response.data['errors'][0])
+        self.assertIn('level', response.data['errors'][1])
+
+        response = self.client.post(url, [
+            {'id': district.id, 'name': '测试县', 'code': '110102'},
+            {'id': county.id, 'name': '测试区', 'code': '110101'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data['errors'][0]), {'name', 'code'})
+        self.assertEqual(set(response.data['errors'][1]), {'name', 'code'})
+
+        payload = [{'temp_id': 'n', 'name': '新区', 'code': 110103, 'level': '区级', 'parent': self.city.id}]
+        with mock.patch.object(Organization, 'save', side_effect=IntegrityError('duplicate')):
+            response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('non_field_errors', response.data['errors'][0])
+
+        response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['code'], '110103')
+
+    def test_bulk_validation_is_set_based(self):
+        """测试整批校验使用固定次数的查询，任何一条失败时不写入数据"""
+        url = reverse('organization-bulk')
+        payload = [
+            {'temp_id': f'd{i}', 'name': f'区{i}', 'code': f'1101{i:02d}', 'level': '区级', 'parent': self.city.id}
+            for i in range(1, 21)
+        ]
+        payload.append({'temp_id': 'dup', 'name': '区1', 'code': '110199', 'level': '区级', 'parent': self.city.id})
+        payload.append({'temp_id': 'bad', 'name': '坏', 'code': '110198', 'level': '市级', 'parent': self.city.id})
+        with self.assertNumQueries(3):
+            response = self.client.post(url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', response.data['errors'][20])
+        self.assertIn('level', response.data['errors'][21])
+        self.assertEqual(Organization.objects.count(), 2)
+
+    def test_export_streams_depth_first(self):
+        """测试以 JSON Lines 和 CSV 流式导出，父区域先于子区域"""
+        url = reverse('organization-export')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.province.id, self.city.id])
+        self.assertEqual(rows[1]['parent'], self.province.id)
+
+        response = self.client.get(url, {'output': 'csv'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith('id,parent,name,code'))
+        self.assertEqual(len(lines), 3)
+
+        response = self.client.get(url, {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_reads_in_path_chunks(self):
+        """测试按路径键集分块读取，每块一次查询且不遗漏区域"""
+        district = Organization.objects.create(name='测试区', code='110101', level='区级', parent=self.province)
+        with mock.patch.object(export, 'EXPORT_CHUNK_SIZE', 1), CaptureQueriesContext(connection) as queries:
+            rows = list(export.iter_rows())
+        self.assertEqual(sum(query['sql'].startswith('SELECT') for query in queries), 4)
+        self.assertEqual([row['id'] for row in rows], [self.province.id, self.city.id, district.id])
+
+    def test_tree_columnar_layout(self):
+        """测试列式树结构可以还原为与默认结构相同的树"""
+        Organization.objects.create(name='测试区', code='110101', level='区级', parent=self.province)
+        tree_url = reverse('organization-tree')
+        expected = json.loads(self.client.get(tree_url).content)
+        columns = json.loads(self.client.get(tree_url, {'layout': 'columnar'}).content)
+
+        # 按顺序遍历一次还原树，父节点下标总是小于自身下标
+        nodes, roots = [], []
+        for i, parent in enumerate(columns['parents']):
+            node = {
+                'id': columns['ids'][i],
+                'level': columns['level_names'][columns['levels'][i]],
+                'children': [],
+            }
+            nodes.append(node)
+            (nodes[parent]['children'] if parent != -1 else roots).append(node)
+
+        def shape(tree):
+            return [(node['id'], node['level'], shape(node['children'])) for node in tree]
+
+        self.assertEqual(shape(roots), shape(expected))
+
+        response = self.client.get(tree_url, {'layout': 'columnar', 'search': '测试'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_children_expansion(self):
+        """测试列表默认不含子节点，include=children 时一次查询取出整页子节点"""
+        response = self.client.get(self.list_url)
+        self.assertNotIn('children', response.data['results'][0])
+
+        with self.assertNumQueries(2):
+            response = self.client.get(self.list_url, {'include': 'children'})
+        children = {item['id']: item['children'] for item in response.data['results']}
+        self.assertEqual([child['id'] for child in children[self.province.id]], [self.city.id])
+        self.assertEqual(children[self.city.id], [])
+
+    def test_sparse_fieldsets(self):
+        """测试 fields 参数只计算和查询请求的字段"""
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url, {'fields': 'id,name,parent'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name', 'parent'})
+
+        # 生成下一页游标需要的 level、code 随同一次查询取出
+        with self.assertNumQueries(1):
+            response = self.client.get(self.list_url, {'fields': 'id,name', 'page_size': 1})
+        self.assertIsNotNone(response.data['next'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.detail_url, {'fields': 'id,level'})
+        self.assertEqual(response.data, {'id': self.province.id, 'level': '省级'})
+
+        response = self.client.get(reverse('organization-tree'), {'fields': 'id,name'})
+        root = json.loads(response.content)[0]
+        self.assertEqual(set(root), {'id', 'name', 'children'})
+        self.assertEqual(set(root['children'][0]), {'id', 'name', 'children'})
+
+    def test_autocomplete(self):
+        """测试按名称和编码前缀联想，结果带完整路径且不访问数据库"""
+        url = reverse('organization-autocomplete')
+        get_snapshot()
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'q': '测试城'})
+        self.assertEqual([item['id'] for item in response.data], [self.city.id])
+        self.assertEqual(response.data[0]['full_path'], '测试省份 / 测试城市')
+
+        response = self.client.get(url, {'q': '1101'})
+        self.assertEqual([item['id'] for item in response.data], [self.city.id])
+        response = self.client.get(url, {'q': '测试', 'limit': 1})
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(self.client.get(url, {'q': ''}).data, [])
+
+    @skipUnless(lazy_pinyin, 'pypinyin 未安装')
+    def test_autocomplete_pinyin(self):
+        """测试按全拼和拼音首字母联想"""
+        url = reverse('organization-autocomplete')
+        response = self.client.get(url, {'q': 'csc'})
+        self.assertEqual([item['id'] for item in response.data], [self.city.id])
+        response = self.client.get(url, {'q': 'ceshish'})
+        self.assertEqual([item['id'] for item in response.data], [self.province.id])
+
+    def test_snapshot_read_paths(self):
+        """测试树形结构、层级和面包屑查询由进程内快照提供"""
+        snapshot = get_snapshot()
+        self.assertEqual(snapshot.to_tree(), build_tree())
+        self.assertEqual(snapshot.ancestors(self.city.id), [self.province.id])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('organization-breadcrumb', args=[self.city.id]))
+        self.assertEqual(response.data['full_path'], self.city.get_full_path())
+        self.assertEqual([item['id'] for item in response.data['breadcrumb']], [self.province.id, self.city.id])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('organization-available-levels', args=[self.city.id]))
+        self.assertEqual(response.data['available_levels'], ['区级', '县级'])
+
+        # 写操作提交后快照随树版本号一起更新
+        with self.captureOnCommitCallbacks(execute=True):
+            self.city.name = '更新后的城市'
+            self.city.save()
+        self.assertIsNot(get_snapshot(), snapshot)
+        self.assertEqual(get_snapshot().full_path(self.city.id), '测试省份 / 更新后的城市')
+
+    def test_tiered_cache(self):
+        """测试进程内缓存层命中与统计"""
+        tree_url = reverse('organization-tree')
+        self.client.get(tree_url)
+        self.client.get(tree_url)
+
+        stats = self.client.get(reverse('organization-cache-stats')).data
+        self.assertEqual(stats['local_hits'], 1)
+        self.assertGreater(stats['local_entries'], 0)
+
+        # 共享缓存中的键被删除后，进程内缓存仍可命中同一版本
+        cache.delete(versioned_key('organization_tree_cache:identity'))
+        with self.assertNumQueries(0):
+            response = self.client.get(tree_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_tiered_cache_bounded_by_bytes(self):
+        """测试多次递增版本后进程内缓存的字节数不超过上限，超限的单个值只写入共享缓存"""
+        local = TieredCache(max_entries=256, max_bytes=3000)
+        for version in range(20):
+            local.set_many({
+                versioned_key(f'tree:{variant}', version): variant.encode() * 1000
+                for variant in ('i', 'g', 'b')
+            })
+            self.assertLessEqual(local.stats()['local_bytes'], 3000)
+        self.assertEqual(local.stats()['local_entries'], 3)
+        self.assertEqual(local.get(versioned_key('tree:b', 19)), b'b' * 1000)
+        self.assertEqual(local.stats()['local_hits'], 1)
+
+        local.set('huge', b'x' * 4000)
+        self.assertEqual(local.stats()['local_entries'], 3)
+        self.assertEqual(local.get('huge'), b'x' * 4000)
+        self.assertEqual(local.stats()['shared_hits'], 1)
+
+    def test_warm_start_from_disk_snapshot(self):
+        """测试新进程使用磁盘快照响应第一次树请求，数据变化后快照失效"""
+        tree_url = reverse('organization-tree')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'organization_tree.snapshot')
+        with override_settings(ORGANIZATION_TREE_SNAPSHOT_PATH=path):
+            expected = self.client.get(tree_url).content
+            self.assertTrue(os.path.exists(path))
+
+            # 模拟新进程启动：清空缓存后只需核对数据指纹
+            load_warm_tree()
+            cache.clear()
+            tiered_cache.clear_local()
+            with self.assertNumQueries(1):
+                response = self.client.get(tree_url)
+            self.assertEqual(response.content, expected)
+
+            # 数据库在快照写入后发生变化时忽略快照
+            load_warm_tree()
+            Organization.objects.filter(pk=self.city.pk).delete()
+            cache.clear()
+            tiered_cache.clear_local()
+            response = self.client.get(tree_url)
+            self.assertNotIn('测试城市', response.content.decode())
+
+    def test_warm_start_released_after_snapshot_build(self):
+        """测试未处理树请求的进程在构建进程内快照后关闭磁盘快照"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'organization_tree.snapshot')
+        with override_settings(ORGANIZATION_TREE_SNAPSHOT_PATH=path):
+            self.client.get(reverse('organization-tree'))
+            load_warm_tree()
+            warm = warm_start._pending
+            self.assertIsNotNone(warm)
+
+            bump_tree_version()
+            get_snapshot()
+            self.assertIsNone(warm_start._pending)
+            self.assertTrue(warm._mapped.closed)
+
+    def test_prewarm_after_write(self):
+        """测试写操作提交后预热新版本的组织树和子节点缓存"""
+        with mock.patch.object(prewarm, 'PREWARM_ENABLED', True):
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.province.name = '更新后的省份'
+                self.province.save()
+                prewarm.schedule_prewarm([self.province.id, None])
+        # 先递增树版本号，预热任务排在其后；测试中在当前线程执行预热
+        self.assertEqual(len(callbacks), 2)
+        callbacks[0]()
+        prewarm.prewarm_tree_cache([self.province.id])
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('organization-tree'))
+        self.assertIn('更新后的省份', response.content.decode())
+
+        children = tiered_cache.get(versioned_key(f'org_children_{self.province.id}'))
+        self.assertEqual(children, OrganizationListSerializer(self.province.children.all(), many=True).data)
@@ -0,0 +1,22 @@
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class ForceRefreshRateThrottle(SimpleRateThrottle):
+    """组织树强制刷新的频率限制
+
+    按用户（未登录时按客户端IP）限制 force_refresh=true 的频率。
+    超过频率的请求不会被拒绝，而是按普通请求处理。
+    """
+    scope = 'organization_force_refresh'
+    default_rate = '6/min'
+
+    def get_rate(self):
+        return self.THROTTLE_RATES.get(self.scope, self.default_rate)
+
+    def get_cache_key(self, request, view):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            ident = user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
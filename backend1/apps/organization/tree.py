@@ -0,0 +1,144 @@
+from django.db.models import Count
+from rest_framework import serializers
+from .models import Organization
+
+# 树节点输出字段，顺序与 OrganizationSerializer 保持一致
+TREE_NODE_FIELDS = [
+    'id', 'name', 'code', 'parent', 'level', 'created_at',
+    'updated_at', 'children', 'status', 'sort_order', 'hierarchical_index'
+]
+
+# 构建树节点需要从数据库读取的列
+TREE_ROW_FIELDS = (
+    'id', 'name', 'code', 'parent_id', 'level', 'created_at',
+    'updated_at', 'status', 'sort_order', 'hierarchical_index'
+)
+
+
+def tree_node(row, datetime_field=None):
+    """把一行区域数据转换为树节点字典，字段顺序与 TREE_NODE_FIELDS 一致
+
+    Args:
+        row: 包含 TREE_ROW_FIELDS 各字段的字典
+        datetime_field: 用于格式化时间的 DateTimeField，为None时时间已是字符串
+    """
+    created_at, updated_at = row['created_at'], row['updated_at']
+    if datetime_field is not None:
+        created_at = datetime_field.to_representation(created_at)
+        updated_at = datetime_field.to_representation(updated_at)
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'code': row['code'],
+        'parent': row['parent_id'],
+        'level': row['level'],
+        'created_at': created_at,
+        'updated_at': updated_at,
+        'children': [],
+        'status': row['status'],
+        'sort_order': row['sort_order'],
+        'hierarchical_index': row['hierarchical_index'],
+    }
+
+
+def build_tree(queryset=None):
+    """构建区域树形结构
+
+    只用一次 values() 查询取出所需字段，一次遍历完成父子链接，
+    再对每组同级节点排序一次，输出与 OrganizationSerializer 相同的JSON结构。
+    整个过程的查询次数与节点数量无关。
+
+    Args:
+        queryset: 参与构建的区域查询集，默认为全部区域
+
+    Returns:
+        list: 根节点列表，每个节点的 children 为其子节点列表
+    """
+    if queryset is None:
+        queryset = Organization.objects.all()
+
+    datetime_field = serializers.DateTimeField()
+    rows = queryset.values(*TREE_ROW_FIELDS)
+
+    nodes = {row['id']: tree_node(row, datetime_field) for row in rows}
+    return link_tree(nodes)
+
+
+def build_tree_slice(root_id=None, max_depth=1):
+    """构建树的局部切片，用于前端按需展开
+
+    指定根区域时通过闭包表取其 max_depth 层以内的后代，否则按 depth 取前 max_depth 层，
+    两者都是索引查询，不扫描整张表。每个节点附带直接子节点数量 child_count
+    和 has_children 标记，切片最底层节点的 children 为空，但可据此判断能否继续展开。
+
+    Args:
+        root_id: 根区域ID，结果为其下级区域（不含根本身），为None时从顶级区域开始
+        max_depth: 返回的层数
+
+    Returns:
+        list: 切片中最上层节点的列表
+    """
+    if root_id is None:
+        queryset = Organization.objects.filter(depth__lte=max_depth)
+    else:
+        queryset = Organization.objects.descendants_of([root_id], max_depth=max_depth, include_self=False)
+    queryset = queryset.annotate(child_count=Count('children', distinct=True))
+
+    datetime_field = serializers.DateTimeField()
+    rows = queryset.values(*TREE_ROW_FIELDS, 'child_count')
+
+    nodes = {}
+    for row in rows:
+        node = tree_node(row, datetime_field)
+        node['has_children'] = row['child_count'] > 0
+        node['child_count'] = row['child_count']
+        nodes[row['id']] = node
+
+    return link_tree(nodes)
+
+
+def link_tree(nodes):
+    """把节点按 parent 链接为树，并对每组同级节点排序一次
+
+    Args:
+        nodes: 区域ID到节点字典的映射，插入顺序即同层级内的输出顺序
+
+    Returns:
+        list: 根节点列表
+    """
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node['parent'])
+        if parent is not None:
+            parent['children'].append(node)
+        else:
+            roots.append(node)
+
+    # 按层级排序，同层级内保持原有顺序
+    def sort_key(node):
+        return Organization.LEVEL_ORDER.get(node['level'], 999)
+
+    roots.sort(key=sort_key)
+    for node in nodes.values():
+        if len(node['children']) > 1:
+            node['children'].sort(key=sort_key)
+    return roots
+
+
+def prune_tree(nodes, fields):
+    """只保留树节点中的指定字段，children 始终保留以维持树形结构
+
+    Args:
+        nodes: 根节点列表
+        fields: 需要保留的字段名集合
+
+    Returns:
+        list: 裁剪后的新树，原树不会被修改
+    """
+    return [
+        {
+            **{key: value for key, value in node.items() if key in fields and key != 'children'},
+            'children': prune_tree(node['children'], fields),
+        }
+        for node in nodes
+    ]
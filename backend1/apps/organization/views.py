@@ -1,15 +1,32 @@
+import logging
+
 from django.shortcuts import render
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action, api_view
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Prefetch
+from django.http import Http404, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Organization
-from .serializers import OrganizationSerializer
+from .serializers import OrganizationListSerializer, OrganizationSerializer, get_requested_fields
 from .permissions import OrganizationPermission
 from .filters import OrganizationFilter
-from django.core.cache import cache
+from .export import EXPORT_FORMATS, iter_csv, iter_jsonl
+from .autocomplete import autocomplete
+from .bulk import BulkOperation, BulkValidationError
+from .pagination import OrganizationCursorPagination
+from .search import search
+from .snapshot import get_snapshot
+from .prewarm import TREE_CACHE_NAME, build_tree_variants, schedule_prewarm
+from .throttles import ForceRefreshRateThrottle
+from .tree import TREE_NODE_FIELDS, build_tree, build_tree_slice, prune_tree
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from .caching import get_or_build, get_tree_version, tiered_cache
+from .rendering import encoded_response, negotiate_encoding, render_variants
+
+logger = logging.getLogger(__name__)
 
 class OrganizationViewSet(viewsets.ModelViewSet):
     """区域管理视图集
@@ -26,6 +43,10 @@ class OrganizationViewSet(viewsets.ModelViewSet):
     permission_classes = [OrganizationPermission]
     filter_backends = [DjangoFilterBackend]
     filterset_class = OrganizationFilter
+    pagination_class = OrganizationCursorPagination
+
+    # tree 动作 fields 参数可选的字段，切片额外包含子节点统计
+    TREE_FIELDS_ALLOWED = frozenset(TREE_NODE_FIELDS) | {'has_children', 'child_count'}
 
     # 层级映射：数字到文本
     LEVEL_MAPPING = {
@@ -79,100 +100,238 @@ class OrganizationViewSet(viewsets.ModelViewSet):
             query = query.exclude(id=exclude_id)
         return not query.exists()
 
+    def _not_modified(self, request, etag):
+        """处理条件请求
+
+        If-None-Match 与当前ETag匹配（弱比较）时返回304响应，否则返回None。
+        """
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if not if_none_match:
+            return None
+        etags = [tag.removeprefix('W/') for tag in parse_etags(if_none_match)]
+        if '*' not in etags and etag not in etags:
+            return None
+        return self._with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+    def _with_etag(self, response, etag):
+        """设置ETag，并要求客户端每次使用前重新验证"""
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    def _include_children(self):
+        """列表是否通过 include=children 展开子节点"""
+        include = self.request.query_params.get('include', '')
+        return 'children' in {name.strip() for name in include.split(',')}
+
+    def get_serializer_class(self):
+        """列表默认使用不含子节点的扁平序列化器"""
+        if self.action == 'list' and not self._include_children():
+            return OrganizationListSerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        """读请求指定 fields 时只查询请求的列，分页排序键始终一并查询
+
+        列表展开子节点时，整页的子节点通过一次 prefetch_related 查询取出并在内存中分组。
+        """
+        queryset = super().get_queryset()
+        requested = get_requested_fields(self.request)
+        if requested:
+            columns = {field.name for field in Organization._meta.concrete_fields} & requested
+            queryset = queryset.only('id', *OrganizationCursorPagination.ordering, *columns)
+        if self.action == 'list' and self._include_children():
+            queryset = queryset.prefetch_related(Prefetch(
+                'children',
+                queryset=Organization.objects.order_by('sort_order', 'code', 'created_at')
+            ))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """获取区域列表
+
+        ETag由树版本号生成，任何写操作都会改变版本号，
+        客户端数据仍为最新时直接返回304，不访问数据库也不执行序列化。
+        """
+        etag = quote_etag(f'org-list-{get_tree_version()}')
+        not_modified = self._not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+        return self._with_etag(super().list(request, *args, **kwargs), etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        """获取区域详情
+
+        详情中包含子节点和层级索引，会随其他区域的变动而变化，
+        因此ETag同样由树版本号和区域ID生成，而不是仅取自身的更新时间。
+        """
+        etag = quote_etag(f'org-{kwargs[self.lookup_field]}-{get_tree_version()}')
+        not_modified = self._not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+        return self._with_etag(super().retrieve(request, *args, **kwargs), etag)
+
+    def perform_create(self, serializer):
+        """创建区域，区域记录与物化路径、闭包表在同一事务中写入"""
+        with transaction.atomic():
+            instance = serializer.save()
+            schedule_prewarm([instance.parent_id])
+
+    def perform_update(self, serializer):
+        """更新区域，移动节点时子树路径与闭包表在同一事务中改写"""
+        old_parent_id = serializer.instance.parent_id
+        with transaction.atomic():
+            instance = serializer.save()
+            schedule_prewarm([old_parent_id, instance.parent_id, instance.id])
+
+    def perform_destroy(self, instance):
+        """删除区域，子树及其闭包表记录在同一事务中级联删除"""
+        parent_id = instance.parent_id
+        with transaction.atomic():
+            instance.delete()
+            schedule_prewarm([parent_id])
+
     @action(detail=False, methods=['get'])
     def tree(self, request):
-        """获取组织机构树形结构"""
+        """获取组织机构树形结构
+
+        缓存的是最终渲染好的JSON字节及其gzip、brotli压缩版本，
+        命中缓存时按 Accept-Encoding 直接返回字节，不再重复编码和压缩。
+        缓存失效后由单个进程重建，重建期间其他请求返回上一个版本，
+        此时ETag对应返回内容的版本，客户端下次请求会重新获取。
+        force_refresh=true 只保证不返回旧版本，不会绕过缓存重复重建。
+
+        传入 root=<区域ID> 和/或 max_depth=<层数> 时只返回树的局部切片（见 build_tree_slice），
+        每个节点带 has_children 和 child_count，供前端逐级展开，此时忽略 search 参数。
+
+        fields=id,name,... 只输出指定字段，children 始终保留；layout=columnar 时忽略。
+
+        layout=columnar 返回列式的紧凑结构（见 TreeSnapshot.to_columns），
+        由进程内快照直接生成，只支持完整的树。
+        """
         search_key = request.query_params.get('search', '')
-        # 添加强制刷新参数，用于清除缓存
-        force_refresh = request.query_params.get('force_refresh', 'false').lower() == 'true'
+        tree_slice = self._get_tree_slice_params(request)
+        if isinstance(tree_slice, Response):
+            return tree_slice
+        columnar = request.query_params.get('layout') == 'columnar'
+        # 只接受树节点中存在的字段，避免任意参数产生无限多的缓存键
+        fields = get_requested_fields(request)
+        if fields is not None:
+            fields = sorted(fields & self.TREE_FIELDS_ALLOWED) or None
+        if columnar and (search_key or tree_slice is not None):
+            return Response(
+                {'detail': 'layout=columnar 仅支持完整的树'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # 强制刷新参数：不接受旧版本，超过频率限制时按普通请求处理
+        force_refresh = (
+            request.query_params.get('force_refresh', 'false').lower() == 'true'
+            and ForceRefreshRateThrottle().allow_request(request, self)
+        )
+        encoding = negotiate_encoding(request)
         
         # 使用缓存存储树形结构，减少数据库查询
-        cache_key = 'organization_tree_cache'
-        if search_key:
-            cache_key = f'{cache_key}_{search_key}'
+        # 缓存键带有树版本号，任何写操作都会使其失效，因此可以长时间缓存
+        cache_name = TREE_CACHE_NAME
+        if columnar:
+            cache_name = f'{cache_name}_columnar'
+        elif tree_slice is not None:
+            cache_name = '{}_slice_{}_{}'.format(cache_name, *tree_slice)
+        elif search_key:
+            cache_name = f'{cache_name}_{search_key}'
+        if fields and not columnar:
+            cache_name = '{}_fields_{}'.format(cache_name, ','.join(fields))
+        version = get_tree_version()
         
-        # 缓存参数
-        cache_timeout = 60  # 60秒，与settings中的开发环境缓存时间保持一致
+        # 客户端已持有当前版本时直接返回304，不访问数据库和缓存数据
+        etag = quote_etag(f'org-tree-{version}-{encoding}')
+        not_modified = self._not_modified(request, etag)
+        if not_modified is not None:
+            patch_vary_headers(not_modified, ['Accept-Encoding'])
+            return not_modified
             
-        # 如果不强制刷新则尝试从缓存获取
-        if not force_refresh:
-            cached_tree = cache.get(cache_key)
-            if cached_tree is not None:
-                return Response(cached_tree)
-        
-        # 定义层级顺序
-        level_order = {
-            '省级': 1,
-            '市级': 2,
-            '区级': 3,
-            '县级': 4
-        }
-        
-        # 基础查询集
-        queryset = self.get_queryset()
-        
-        # 如果有搜索关键字，先查找匹配的节点
-        if search_key:
-            queryset = queryset.filter(
-                Q(name__icontains=search_key) |
-                Q(code__icontains=search_key)
-            ).distinct()
-            
-            # 获取匹配节点的所有父节点ID
-            parent_ids = set()
-            for org in queryset:
-                current = org
-                while current.parent_id:
-                    parent_ids.add(current.parent_id)
-                    current = current.parent
-            
-            # 合并搜索结果和父节点
-            if parent_ids:
-                queryset = self.get_queryset().filter(
-                    Q(id__in=queryset.values_list('id', flat=True)) |
-                    Q(id__in=parent_ids)
-                )
-        
-        # 优化查询，减少数据库访问
-        queryset = queryset.select_related('parent')
-        
-        # 把所有组织按树形结构返回
-        roots = []
-        org_dict = {}
-        
-        # 构建字典，便于快速查找
-        for org in queryset:
-            data = self.serializer_class(org, context={'request': request}).data
-            data['children'] = []
-            org_dict[org.id] = data
-            
-        # 构建树形结构
-        for org_id, org_data in org_dict.items():
-            if org_data.get('parent') and org_data['parent'] in org_dict:
-                org_dict[org_data['parent']]['children'].append(org_data)
+        def build():
+            if columnar:
+                return render_variants(get_snapshot().to_columns())
+            if tree_slice is not None:
+                root_id, max_depth = tree_slice
+                if root_id is not None and not Organization.objects.filter(pk=root_id).exists():
+                    raise Http404
+                data = build_tree_slice(root_id, max_depth)
+            elif search_key:
+                data = self._build_tree_data(search_key)
+            elif fields:
+                data = get_snapshot().to_tree()
             else:
-                roots.append(org_data)
-                
-        # 按层级排序
-        def sort_by_level(item):
-            return level_order.get(item.get('level', ''), 999)
-            
-        # 递归排序所有节点
-        def sort_node(node):
-            if node.get('children'):
-                node['children'] = sorted(node['children'], key=sort_by_level)
-                for child in node['children']:
-                    sort_node(child)
-                    
-        # 排序根节点
-        roots = sorted(roots, key=sort_by_level)
-        for root in roots:
-            sort_node(root)
+                return build_tree_variants()
+            if fields:
+                data = prune_tree(data, set(fields))
+            return render_variants(data)
         
-        # 缓存处理结果，减少后续查询
-        cache.set(cache_key, roots, cache_timeout)
-        
-        return Response(roots)
+        # 缓存未命中时只有一个进程重建，其他进程继续返回上一个版本。
+        # 强制刷新同样合并到正在进行的重建中，只是不接受旧版本；
+        # 当前版本已经构建过时说明树没有变化，直接返回已构建的结果。
+        body_version, body = get_or_build(
+            cache_name, encoding, build, version=version, allow_stale=not force_refresh
+        )
+        if body_version != version:
+            etag = quote_etag(f'org-tree-{body_version}-{encoding}')
+        return self._with_etag(encoded_response(body, encoding), etag)
+
+    def _get_tree_slice_params(self, request):
+        """解析树切片参数
+
+        Returns:
+            未传入切片参数时返回None，参数有误时返回400响应，否则返回 (root_id, max_depth)
+        """
+        root = request.query_params.get('root')
+        max_depth = request.query_params.get('max_depth')
+        if root is None and max_depth is None:
+            return None
+        try:
+            root_id = int(root) if root else None
+            max_depth = int(max_depth) if max_depth else 1
+        except ValueError:
+            return Response({'detail': 'root 和 max_depth 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+        if max_depth < 1:
+            return Response({'detail': 'max_depth 必须大于0'}, status=status.HTTP_400_BAD_REQUEST)
+        return root_id, max_depth
+
+    def _build_tree_data(self, search_key):
+        """构建搜索结果的树形结构数据
+
+        Args:
+            search_key: 搜索关键字
+
+        Returns:
+            list: 根节点列表，包含匹配节点及其全部祖先
+        """
+        # 先通过 n-gram 索引查找匹配的节点，物化路径中已包含全部祖先ID
+        paths = search(Organization.objects.all(), search_key).values_list('path', flat=True)
+        ids = {
+            int(org_id)
+            for path in paths
+            for org_id in path.split(Organization.PATH_SEPARATOR) if org_id
+        }
+
+        # 匹配节点及其祖先一次查询取出所需字段，在内存中组装树形结构
+        queryset = Organization.objects.filter(id__in=ids)
+        return build_tree(queryset)
+
+    def _get_snapshot_object(self, snapshot):
+        """从进程内快照中获取当前请求的区域，不访问数据库
+
+        返回的是未保存的模型实例，仅用于只读场景，同样会执行对象级权限检查。
+        """
+        try:
+            org_id = int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (TypeError, ValueError):
+            raise Http404
+        if org_id not in snapshot:
+            raise Http404
+        instance = snapshot.as_instance(org_id)
+        self.check_object_permissions(self.request, instance)
+        return instance
 
     def create(self, request, *args, **kwargs):
         """创建区域
@@ -256,11 +415,9 @@ class OrganizationViewSet(viewsets.ModelViewSet):
 
                 serializer = self.get_serializer(data=request.data)
                 serializer.is_valid(raise_exception=True)
+                # 保存后模型会在事务提交时递增树版本号，使组织树缓存失效
                 self.perform_create(serializer)
                 
-                # 创建成功后清除组织树缓存，确保前端能立即看到新数据
-                self._clear_tree_cache()
-                
                 headers = self.get_success_headers(serializer.data)
                 return Response(
                     {
@@ -348,14 +505,8 @@ class OrganizationViewSet(viewsets.ModelViewSet):
             serializer.is_valid(raise_exception=True)
             self.perform_update(serializer)
             
-            # 更新成功后清除相关缓存
+            # 模型保存后会递增树版本号，相关缓存随之失效
             instance_id = instance.id
-            # 清除该记录的缓存
-            cache_key = f'org_index_{instance_id}'
-            cache.delete(cache_key)
-            
-            # 清除组织树缓存
-            self._clear_tree_cache()
             
             print(f"已成功更新组织ID: {instance_id} 并清除相关缓存")
             
@@ -384,7 +535,8 @@ class OrganizationViewSet(viewsets.ModelViewSet):
             Response: 可用层级列表
         """
         try:
-            instance = self.get_object()
+            # 层级直接从进程内快照读取，不访问数据库
+            instance = self._get_snapshot_object(get_snapshot())
             available = []
             
             if instance.level == '省级':
@@ -400,6 +552,102 @@ class OrganizationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """批量创建和更新区域
+
+        请求体为操作列表（格式见 bulk.py），新建区域可以通过 parent_temp_id
+        引用同一批次中的其他新建区域。整批校验只需固定次数的查询，
+        全部通过后在一个事务中写入，树缓存只失效一次。
+        校验失败时返回400，errors 中按操作下标给出各字段的错误。
+        """
+        operation = BulkOperation(request.data)
+        try:
+            operation.validate()
+            # apply 会原地修改已有区域实例，原父级需在写入前记录
+            parent_ids = {org.parent_id for org in operation.existing.values()}
+            instances = operation.apply()
+        except BulkValidationError as e:
+            return Response(
+                {'detail': '批量操作校验失败', 'errors': e.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception as e:
+            logger.exception('批量操作区域时发生错误')
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        parent_ids.update(instance.parent_id for instance in instances)
+        schedule_prewarm(parent_ids)
+
+        results = OrganizationListSerializer(instances, many=True).data
+        for item, result in zip(request.data, results):
+            if item.get('temp_id') is not None:
+                result['temp_id'] = item['temp_id']
+        return Response({'results': results, 'cache_refreshed': True})
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """流式导出区域层级
+
+        output=jsonl（默认）或 csv。按物化路径深度优先输出，支持与列表相同的过滤参数。
+        数据分块读取、逐行写出，不在内存中构建完整的树；
+        全部分块在同一个可重复读事务中读取，导出结果对应同一时刻的数据。
+        """
+        output = request.query_params.get('output', 'jsonl')
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {'detail': f'不支持的导出格式: {output}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        content_type, filename = EXPORT_FORMATS[output]
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = iter_csv(queryset) if output == 'csv' else iter_jsonl(queryset)
+        response = StreamingHttpResponse(rows, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """区域输入联想
+
+        q 按名称、编码、全拼或拼音首字母（如 bjs 匹配北京市）做前缀匹配，
+        limit 为返回数量（默认10，最多50）。查询在进程内前缀索引上完成，不访问数据库。
+        """
+        prefix = request.query_params.get('q', '')
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response({'detail': 'limit 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(autocomplete(prefix, limit))
+
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        """获取区域缓存的命中统计
+
+        用于观察进程内LRU缓存与共享缓存的命中情况，调整缓存容量。
+        统计数据仅针对处理本请求的工作进程。
+        """
+        return Response({
+            'tree_version': get_tree_version(),
+            **tiered_cache.stats(),
+        })
+
+    @action(detail=True, methods=['get'])
+    def breadcrumb(self, request, pk=None):
+        """获取区域的面包屑路径
+
+        从进程内快照读取祖先链，不访问数据库。
+
+        Returns:
+            Response: 完整路径字符串及从根节点到自身的节点列表
+        """
+        snapshot = get_snapshot()
+        instance = self._get_snapshot_object(snapshot)
+        return Response({
+            'full_path': snapshot.full_path(instance.id),
+            'breadcrumb': snapshot.breadcrumb(instance.id),
+        })
+
     def destroy(self, request, *args, **kwargs):
         """删除组织记录并清除缓存
         
@@ -413,15 +661,9 @@ class OrganizationViewSet(viewsets.ModelViewSet):
             response_data = {'cache_refreshed': True, 'id': instance_id, 'success': True}
             
             # 执行删除操作
+            # 删除后模型会递增树版本号，相关缓存随之失效
             self.perform_destroy(instance)
             
-            # 清除该记录的缓存
-            cache_key = f'org_index_{instance_id}'
-            cache.delete(cache_key)
-            
-            # 清除组织树缓存
-            self._clear_tree_cache()
-            
             print(f"已成功删除组织ID: {instance_id} 并清除相关缓存")
             
             # 返回200而不是204，因为我们有响应内容
@@ -433,20 +675,3 @@ class OrganizationViewSet(viewsets.ModelViewSet):
                 {'detail': str(e), 'success': False},
                 status=status.HTTP_400_BAD_REQUEST
             )
-
-    def _clear_tree_cache(self):
-        """清除所有组织树相关的缓存
-        
-        包括主树缓存和各种搜索条件下的缓存
-        """
-        # 清除默认的树缓存
-        cache.delete('organization_tree_cache')
-        
-        # 对于搜索条件缓存，我们可以设置一个通用的前缀并使用通配符删除
-        # 但大多数缓存后端不支持通配符删除，所以这里列出常见搜索关键词删除
-        common_search_terms = ['省', '市', '区', '县']
-        for term in common_search_terms:
-            cache.delete(f'organization_tree_cache_{term}')
-        
-        # 记录日志
-        print(f"已清除组织树相关缓存") 
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""组织树的磁盘快照
+
+每次重建完整的组织树后，把渲染好的各编码版本写入一个紧凑的二进制文件；
+新的工作进程启动时在 AppConfig.ready 中以内存映射方式打开该文件（只解析文件头，
+不访问数据库），第一次请求组织树时如果文件中的数据指纹与数据库一致，
+直接发布文件中的内容，不必完整重建。
+进程先构建了进程内快照时（如输入联想、面包屑请求），整树可由快照廉价渲染，
+磁盘快照随即关闭，不会在不处理树请求的进程中一直占用内存映射和文件描述符。
+
+文件格式（小端）：
+    文件头    8字节魔数、2字节指纹长度、2字节变体数量
+    指纹      UTF-8 字符串
+    变体表    每项16字节编码名称（右侧补零）、8字节偏移量、8字节长度
+    数据区    各编码版本的响应字节
+"""
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+from django.conf import settings
+
+from .models import Organization
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ORGTREE1'
+HEADER = struct.Struct('<8sHH')
+ENTRY = struct.Struct('<16sQQ')
+
+_pending = None
+_pending_lock = threading.Lock()
+
+
+def get_snapshot_path():
+    """磁盘快照文件路径，未配置 ORGANIZATION_TREE_SNAPSHOT_PATH 时不启用"""
+    return getattr(settings, 'ORGANIZATION_TREE_SNAPSHOT_PATH', None)
+
+
+class WarmTree:
+    """以内存映射方式打开的磁盘快照，数据区在使用时才读取"""
+
+    def __init__(self, mapped):
+        self._mapped = mapped
+        magic, fingerprint_length, count = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC:
+            raise ValueError('不是有效的组织树快照文件')
+        offset = HEADER.size
+        self.fingerprint = mapped[offset:offset + fingerprint_length].decode('utf-8')
+        offset += fingerprint_length
+        self._entries = {}
+        for _ in range(count):
+            name, body_offset, length = ENTRY.unpack_from(mapped, offset)
+            self._entries[name.rstrip(b'\0').decode('ascii')] = (body_offset, length)
+            offset += ENTRY.size
+
+    def variants(self):
+        """读取全部编码版本的响应字节"""
+        return {
+            name: self._mapped[body_offset:body_offset + length]
+            for name, (body_offset, length) in self._entries.items()
+        }
+
+    def close(self):
+        self._mapped.close()
+
+
+def save_warm_tree(fingerprint, variants):
+    """把完整组织树的各编码版本写入磁盘快照
+
+    先写入同目录下的临时文件再原子替换，读取方不会看到写了一半的文件。
+    写入失败只记录日志，不影响请求。
+    """
+    path = get_snapshot_path()
+    if not path:
+        return
+    fingerprint = fingerprint.encode('utf-8')
+    names = list(variants)
+    offset = HEADER.size + len(fingerprint) + ENTRY.size * len(names)
+    entries = []
+    for name in names:
+        entries.append(ENTRY.pack(name.encode('ascii'), offset, len(variants[name])))
+        offset += len(variants[name])
+
+    directory = os.path.dirname(os.fspath(path)) or '.'
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.organization_tree')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, len(fingerprint), len(names)))
+                f.write(fingerprint)
+                f.writelines(entries)
+                for name in names:
+                    f.write(variants[name])
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    except OSError:
+        logger.exception('写入组织树磁盘快照失败: %s', path)
+
+
+def load_warm_tree():
+    """在进程启动时打开磁盘快照，只解析文件头，不访问数据库"""
+    global _pending
+    path = get_snapshot_path()
+    if not path or not os.path.exists(path):
+        return
+    try:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        warm = WarmTree(mapped)
+    except (OSError, ValueError, struct.error):
+        logger.warning('无法读取组织树磁盘快照: %s', path, exc_info=True)
+        return
+    with _pending_lock:
+        _pending = warm
+
+
+def take_warm_tree():
+    """取出启动时加载的磁盘快照
+
+    每个进程只使用一次：数据指纹与数据库一致时返回各编码版本，否则返回None。
+    """
+    global _pending
+    with _pending_lock:
+        warm, _pending = _pending, None
+    if warm is None:
+        return None
+    try:
+        if warm.fingerprint != Organization.objects.fingerprint():
+            return None
+        return warm.variants()
+    finally:
+        warm.close()
+
+
+def discard_warm_tree():
+    """关闭尚未使用的磁盘快照，进程内快照构建后调用"""
+    global _pending
+    with _pending_lock:
+        warm, _pending = _pending, None
+    if warm is not None:
+        warm.close()
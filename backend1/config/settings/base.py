@@ -134,8 +134,27 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    'DEFAULT_THROTTLE_RATES': {
+        'organization_force_refresh': '6/min',  # 组织树强制刷新频率
+    },
 }
 
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # Only for development
-CORS_ALLOW_CREDENTIALS = True 
\ No newline at end of file
+CORS_ALLOW_CREDENTIALS = True 
+# 区域缓存设置
+# 区域相关缓存键均带有树版本号，写操作提交后立即失效，因此可以设置较长的超时时间
+ORGANIZATION_TREE_CACHE_TIMEOUT = 6 * 60 * 60
+# 组织树重建锁的超时时间（秒），以及没有旧版本可用时等待其他进程重建的最长时间（秒）
+ORGANIZATION_TREE_REBUILD_LOCK_TIMEOUT = 30
+ORGANIZATION_TREE_REBUILD_WAIT_TIMEOUT = 5
+# 区域缓存在共享缓存前的进程内LRU缓存条目数，为0时不启用
+ORGANIZATION_LOCAL_CACHE_MAX_ENTRIES = 256
+# 进程内LRU缓存的最大字节数（按缓存的 bytes/str 长度计算），防止旧版本的整树变体累积
+ORGANIZATION_LOCAL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# 写操作提交后在后台线程中按新版本预热组织树和子节点缓存
+ORGANIZATION_CACHE_PREWARM = True
+ORGANIZATION_CACHE_PREWARM_WORKERS = 1
+# 区域列表键集分页的默认每页条数和 page_size 参数上限
+ORGANIZATION_PAGE_SIZE = 100
+ORGANIZATION_MAX_PAGE_SIZE = 1000
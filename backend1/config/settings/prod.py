@@ -32,6 +32,9 @@ CACHES = {
     }
 }
 
+# 组织树磁盘快照，新进程启动后第一次请求组织树时无需完整重建
+ORGANIZATION_TREE_SNAPSHOT_PATH = BASE_DIR / 'var' / 'organization_tree.snapshot'
+
 # Logging
 LOGGING = {
     'version': 1,
@@ -1,4 +1,4 @@
-import type { Organization, OrganizationResponse,  } from '@/types/organization'
+import type { Organization, OrganizationResponse, OrganizationTreeColumns } from '@/types/organization'
 import request from '@/utils/request'
 import type { OrganizationForm } from '@/types/organization'
 
@@ -7,10 +7,28 @@ export function getOrganizationTree() {
   return request.get<Organization[]>('/organizations/tree/')
 }
 
+// 获取列式的紧凑组织树，使用 buildTreeFromColumns 还原
+export function getOrganizationTreeColumns() {
+  return request.get<OrganizationTreeColumns>('/organizations/tree/', { params: { layout: 'columnar' } })
+}
+
+// 按需获取组织树的局部切片（root 为空时从顶级区域开始）
+export function getOrganizationTreeSlice(params: { root?: number, max_depth?: number }) {
+  return request.get<Organization[]>('/organizations/tree/', { params })
+}
+
+// 区域输入联想：按名称、编码、全拼或拼音首字母前缀匹配
+export function autocompleteOrganizations(q: string, limit = 10) {
+  return request.get<{ id: number, name: string, code: string, level: string, full_path: string }[]>(
+    '/organizations/autocomplete/',
+    { params: { q, limit } }
+  )
+}
+
 // 获取组织架构列表
 export const getOrganizationList = (params?: {
   search?: string
-  page?: number
+  cursor?: string
   page_size?: number
   level?: string
   parent?: number
@@ -23,6 +41,14 @@ export function createOrganization(data: OrganizationForm) {
   return request.post<Organization>('/organizations/', data)
 }
 
+// 批量创建和更新组织，新建项可通过 parent_temp_id 引用同批次中其他新建项的 temp_id
+export function bulkSaveOrganizations(items: Array<Record<string, unknown>>) {
+  return request.post<{ results: Array<Organization & { temp_id?: string }>, cache_refreshed: boolean }>(
+    '/organizations/bulk/',
+    items
+  )
+}
+
 // 更新组织
 export function updateOrganization(id: number, data: OrganizationForm) {
   return request.put<Organization>(`/organizations/${id}/`, data)
@@ -42,7 +68,7 @@ export const getOrganizationDetail = (id: number) => {
 
 // 获取行政区域内的组织（除基层单位外所有单位）
 export const getUnitsInRegion = (regionId: number) => {
-  return request.get<Organization[]>('/organizations/', {
+  return request.get<OrganizationResponse>('/organizations/', {
     params: { 
       parent: regionId,
       exclude_level: '基层'
@@ -52,7 +78,7 @@ export const getUnitsInRegion = (regionId: number) => {
 
 // 获取行政区域内的基层单位
 export const getBasicUnitsInRegion = (regionId: number) => {
-  return request.get<Organization[]>('/organizations/', {
+  return request.get<OrganizationResponse>('/organizations/', {
     params: { 
       parent: regionId,
       level: '基层'
@@ -62,14 +88,14 @@ export const getBasicUnitsInRegion = (regionId: number) => {
 
 // 获取指定级别的组织架构
 export const getByLevel = (level: string) => {
-  return request.get<Organization[]>('/organizations/', {
+  return request.get<OrganizationResponse>('/organizations/', {
     params: { level }
   })
 }
 
 // 获取指定区域的组织架构
 export const getByRegion = (region: number) => {
-  return request.get<Organization[]>('/organizations/', {
+  return request.get<OrganizationResponse>('/organizations/', {
     params: { region }
   })
 }
@@ -111,10 +111,24 @@ export interface OrganizationTreeNode {
   children?: OrganizationTreeNode[]
 }
 
-// 定义API响应类型
+// 列式组织树（tree?layout=columnar），各列按深度优先先序排列
+export interface OrganizationTreeColumns {
+  ids: number[]
+  parents: number[]
+  names: string[]
+  codes: string[]
+  levels: number[]
+  level_names: LevelType[]
+  statuses: number[]
+  sort_orders: number[]
+  hierarchical_indexes: string[]
+}
+
+// 定义API响应类型（列表按游标分页）
 export interface OrganizationResponse {
-  data: Organization[]
-  total: number
+  next: string | null
+  previous: string | null
+  results: Organization[]
 }
 
 export type LevelType = '省级' | '市级' | '区级' | '县级'
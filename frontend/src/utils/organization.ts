@@ -1,4 +1,4 @@
-import type { Organization, LevelType } from '@/types/organization'
+import type { Organization, LevelType, OrganizationTreeColumns } from '@/types/organization'
 
 /**
  * 获取层级对应的数值
@@ -91,4 +91,35 @@ export const getHierarchicalIndex = (org: Organization): string => {
   const index = siblings.findIndex(child => child.id === org.id) + 1
   
   return `${parentIndex}.${index}`
-} 
\ No newline at end of file
+} 
+
+/**
+ * 由列式组织树还原嵌套的树形结构
+ * @param columns tree?layout=columnar 的响应数据
+ * @returns 根节点列表
+ */
+export const buildTreeFromColumns = (columns: OrganizationTreeColumns): Organization[] => {
+  const nodes: Organization[] = []
+  const roots: Organization[] = []
+  columns.ids.forEach((id, i) => {
+    const parent = columns.parents[i]
+    const node: Organization = {
+      id,
+      name: columns.names[i],
+      code: columns.codes[i],
+      level: columns.level_names[columns.levels[i]],
+      parent: parent === -1 ? undefined : nodes[parent].id,
+      status: Boolean(columns.statuses[i]),
+      sort_order: columns.sort_orders[i],
+      hierarchicalIndex: columns.hierarchical_indexes[i],
+      children: []
+    }
+    nodes.push(node)
+    if (parent === -1) {
+      roots.push(node)
+    } else {
+      nodes[parent].children!.push(node)
+    }
+  })
+  return roots
+}